@@ -1,39 +1,245 @@
 import asyncio
 import logging
-from typing import Optional
+import time
+from typing import Optional, Dict, Any
 
+import aiohttp
+
+from apps.charts import charts
 from apps.pandora.api import Pandora
+from apps.utils.checkpoint import checkpoints
+from apps.utils.heater import HeaterDetector, HEATER_INCONCLUSIVE, HEATER_ON
+from apps.utils.telemetry import telemetry
+from apps.utils.wait import wait_until
+from apps.utils.warmup import warmup_model, COLD_OUT_TEMP, COLD_ENGINE_TEMP
 import core.tg_msg as tg_msg
 from core import settings
-from core.config import bot
+from core.config import Account
 
 logger = logging.getLogger(__name__)
 
+# Этапы холодного запуска для контрольных точек
+STAGE_HEATER = "heater"
+STAGE_WARMUP = "warmup"
+STAGE_START = "start"
+
 
 class ColdStart:
-    def __init__(self, test: bool = False):
+    def __init__(
+        self,
+        test: bool = False,
+        device_id: Optional[int] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+        account: Optional[Account] = None,
+        resume: Optional[Dict[str, Any]] = None,
+    ):
         self.pandora: Optional[Pandora] = None
+        self.device_id = device_id
+        self.account = account
+        self._session = session  # по умолчанию — общая HTTP-сессия процесса
         self.heater_on = False
         self.__test = test
         self.heater_retries = 2
+        self.heater_timeout = 180  # макс. ожидание падения напряжения, сек
+        self.heater_sample_interval = 5  # интервал замеров после команды, сек
+        self.heater_baseline_samples = 3  # замеров напряжения до команды
+        self.detector = HeaterDetector(threshold=0.2)
+        # Отметки последнего засчитанного ответа устройства
+        self._reported: Dict[str, Any] = {}
+        self.cycle_timeout = 120  # макс. длительность цикла прогрева, сек
+        self.poll_interval = 10  # начальный интервал опроса, сек
+        self.poll_max_interval = 60
+        self.phase = "ожидание"  # текущий этап для отчёта о ходе запуска
+        self.started_at: Optional[float] = None
+        self.stage: Optional[str] = None
+        self.warmup_start_temp: Optional[float] = None
+        self._resume = resume  # контрольная точка прерванного запуска
+        # Итоги для истории запусков (отчёт /report)
+        self.heater_checked = False
+        self.heater_drop: Optional[float] = None  # падение напряжения, В
+        self.warmup_minutes: Optional[float] = None  # до безопасной температуры
+        self.warmup_timeout = False  # прогрев не завершился за 15 циклов
 
     # ---------------------------
     # Основной сценарий
     # ---------------------------
+    @property
+    def progress(self) -> str:
+        """Текущий этап и время с начала запуска."""
+        if self.started_at is None:
+            return self.phase
+        minutes = int((time.monotonic() - self.started_at) // 60)
+        return f"{self.phase} ({minutes} мин)"
+
+    @property
+    def is_test(self) -> bool:
+        return self.__test
+
     async def begin(self):
         logger.info("Начало процедуры холодного запуска")
-        async with Pandora() as pandora:
+        self.started_at = time.monotonic()
+        self.phase = "проверка состояния"
+        async with (
+            Pandora(self.device_id, self._session, self.account) as pandora,
+            pandora.poller.active(),
+        ):
             self.pandora = pandora
-            await self._initialize_state()
+            self.account = pandora.account
+            # Сообщения о ходе запуска собираются в одну карточку
+            card = tg_msg.StatusCard(pandora.state).open()
+            outcome = "⚠️ Холодный запуск завершился ошибкой"
+            result = "error"
+            try:
+                if self._resume:
+                    await self._continue()
+                else:
+                    await self._run()
+                outcome = "🏁 Холодный запуск завершён"
+                result = "done"
+            except asyncio.CancelledError:
+                if checkpoints.suspended:
+                    # Остановка процесса: запуск продолжится после перезапуска
+                    logger.info("Холодный запуск прерван на этапе: %s", self.phase)
+                    outcome = "⏸ Холодный запуск прерван, продолжится после перезапуска"
+                    result = None
+                    raise
+                logger.info("Холодный запуск отменён на этапе: %s", self.phase)
+                outcome = f"⛔ Холодный запуск отменён ({self.phase})"
+                result = "cancelled"
+                self.phase = "отменён"
+                self._clear_checkpoint()
+                raise
+            except BaseException:
+                self._clear_checkpoint()
+                raise
+            finally:
+                if result is not None:
+                    self._record_run(result)
+                await card.finish(self._summary(outcome))
+                if result is not None and settings.charts.enabled:
+                    charts.send_run(
+                        pandora.state,
+                        self._started_wall,
+                        "📈 Температура двигателя и напряжение",
+                    )
+            self._clear_checkpoint()
+
+    @property
+    def _started_wall(self) -> float:
+        """Время начала запуска (unix)."""
+        return time.time() - (time.monotonic() - self.started_at)
+
+    def _record_run(self, result: str):
+        """Сохраняет итоги запуска в историю для отчёта."""
+        s = self.pandora.state
+        if not self.pandora.device_id:
+            return
+        telemetry.record_run(
+            device_id=self.pandora.device_id,
+            started_at=self._started_wall,
+            test=self.__test,
+            result=result,
+            out_temp=s.out_temp,
+            engine_temp_before=s.engine_temp_before,
+            voltage_before=s.voltage_before,
+            heater_on=self.heater_on if self.heater_checked else None,
+            heater_drop=self.heater_drop,
+            cycles=s.count if self.warmup_start_temp is not None else None,
+            warmup_minutes=self.warmup_minutes,
+            warmup_timeout=self.warmup_timeout,
+            engine_temp_after=s.engine_temp,
+            finished_at=time.time(),
+        )
 
-            if self.pandora.state.engine_on:
-                await self._notify("Двигатель уже запущен")
-                return
+    def _summary(self, outcome: str) -> str:
+        """Итог запуска для отдельного сообщения после карточки."""
+        s = self.pandora.state
+        minutes = int((time.monotonic() - self.started_at) // 60)
+        return (
+            f"<b>{outcome}</b> ({minutes} мин)\n"
+            f"Двигатель: {s.engine_temp}°C (было {s.engine_temp_before}°C)\n"
+            f"Аккумулятор: {s.voltage} V\n"
+            f"Последний этап: {self.phase}"
+        )
 
-            if self._is_cold_start_condition():
-                await self._handle_cold_start()
+    async def _run(self):
+        await self._initialize_state()
+
+        if self.pandora.state.engine_on:
+            await self._notify("Двигатель уже запущен")
+            return
+
+        if self._is_cold_start_condition():
+            await self._handle_cold_start()
+        else:
+            await self._handle_warm_start()
+
+    # ---------------------------
+    # Контрольные точки
+    # ---------------------------
+    @property
+    def _checkpoint_key(self) -> str:
+        return checkpoints.key(self.account.name, self.pandora.device_id)
+
+    def _checkpoint(self, stage: Optional[str] = None):
+        """Сохраняет этап и счётчики, чтобы продолжить запуск после перезапуска."""
+        if stage is not None:
+            self.stage = stage
+        state = self.pandora.state
+        checkpoints.save(
+            self._checkpoint_key,
+            account=self.account.name,
+            device_id=self.pandora.device_id,
+            test=self.__test,
+            stage=self.stage,
+            phase=self.phase,
+            elapsed=time.monotonic() - self.started_at,
+            count=state.count,
+            engine_temp_before=state.engine_temp_before,
+            voltage_before=state.voltage_before,
+            warmup_start_temp=self.warmup_start_temp,
+            heater_on=self.heater_on,
+            baseline=list(self.detector.baseline),
+        )
+
+    def _clear_checkpoint(self):
+        if self.pandora is not None and self.pandora.device_id:
+            checkpoints.remove(self._checkpoint_key)
+
+    async def _continue(self):
+        """Продолжает прерванный запуск с сохранённого этапа."""
+        saved = self._resume
+        state = self.pandora.state
+        self.stage = saved.get("stage")
+        self.started_at = time.monotonic() - saved.get("elapsed", 0)
+        self.heater_on = bool(saved.get("heater_on"))
+        self.warmup_start_temp = saved.get("warmup_start_temp")
+        for voltage in saved.get("baseline") or []:
+            self.detector.add_baseline(voltage)
+        logger.info("Продолжаем холодный запуск с этапа %s", self.stage)
+
+        await self.pandora.check()
+        state.engine_temp_before = saved.get("engine_temp_before")
+        state.voltage_before = saved.get("voltage_before")
+        state.count = saved.get("count") or 0
+        if state.engine_on:
+            await self._notify("Двигатель уже запущен")
+            return
+        await self._notify("🔄 Продолжаю холодный запуск после перезапуска")
+
+        if self.stage == STAGE_WARMUP:
+            await self._wait_for_warmup(resume=True)
+        elif self.stage == STAGE_HEATER:
+            # Команда подогревателю могла уйти до перезапуска — сперва замеры
+            self.phase = "проверка подогревателя"
+            if await self._measure_heater():
+                await self._wait_for_warmup()
             else:
-                await self._handle_warm_start()
+                await self._handle_cold_start()
+        elif self.stage == STAGE_START:
+            await self._safe_start_engine()
+        else:
+            await self._run()
 
     # ---------------------------
     # Инициализация состояния
@@ -42,6 +248,7 @@ class ColdStart:
         await self.pandora.check()
         self.pandora.state.engine_temp_before = self.pandora.state.engine_temp
         self.pandora.state.voltage_before = self.pandora.state.voltage
+        self.detector.add_baseline(self.pandora.state.voltage)
 
         self._log_state()
         await tg_msg.msg_params(self.pandora.state)
@@ -51,8 +258,8 @@ class ColdStart:
     # ---------------------------
     def _is_cold_start_condition(self) -> bool:
         condition = (
-            self.pandora.state.out_temp <= 5,
-            self.pandora.state.engine_temp_before < 30,
+            self.pandora.state.out_temp <= COLD_OUT_TEMP,
+            self.pandora.state.engine_temp_before < COLD_ENGINE_TEMP,
         )
         return all(condition)
 
@@ -61,7 +268,9 @@ class ColdStart:
     # ---------------------------
     async def _handle_cold_start(self):
         logger.info("Холодная погода и холодный двигатель — начинаем прогрев")
-        await tg_msg.msg_cold_start()
+        self.phase = "включение подогревателя"
+        await tg_msg.msg_cold_start(self.pandora.state)
+        self._checkpoint(STAGE_HEATER)
 
         success = await self._try_start_heater()
         if not success:
@@ -83,6 +292,8 @@ class ColdStart:
     # ---------------------------
     async def _try_start_heater(self) -> bool:
         self.pandora.state.count = 0
+        await self._collect_baseline()
+        self._checkpoint()
         for attempt in range(1, self.heater_retries + 1):
             logger.info(
                 f"Попытка включения подогревателя ({attempt}/{self.heater_retries})"
@@ -103,12 +314,19 @@ class ColdStart:
     # ---------------------------
     # Ожидание прогрева
     # ---------------------------
-    async def _wait_for_warmup(self):
-        self.pandora.state.count = 0
-        start_temp = self.pandora.state.engine_temp
+    async def _wait_for_warmup(self, resume: bool = False):
+        if not resume or self.warmup_start_temp is None:
+            self.pandora.state.count = 0
+            self.warmup_start_temp = self.pandora.state.engine_temp
+        start_temp = self.warmup_start_temp
 
         while self.pandora.state.engine_temp < 20 and self.pandora.state.count < 15:
             self.pandora.state.count += 1
+            self.phase = (
+                f"прогрев: {self.pandora.state.engine_temp}°C, "
+                f"цикл {self.pandora.state.count}/15"
+            )
+            self._checkpoint(STAGE_WARMUP)
 
             # Проверяем, не запущен ли двигатель вручную
             if self.pandora.state.engine_on:
@@ -121,12 +339,24 @@ class ColdStart:
                 await self._second_check_heater(start_temp)
 
             await self._log_wait_state()
-            await asyncio.sleep(120)
-            await self.pandora.check()
+            # Цикл завершается сразу, как только двигатель прогрелся или запущен
+            if not await self._wait_for(self._is_warmed_up, self.cycle_timeout):
+                await self.pandora.check()
 
         if self.pandora.state.engine_temp >= 20:
             await self._ready_to_start()
         else:
+            self.warmup_timeout = True
+            if not self.__test:
+                # Прогрев дольше отведённого — нижняя граница для прогноза
+                s = self.pandora.state
+                warmup_model.add(
+                    s.out_temp,
+                    s.engine_temp_before,
+                    s.voltage_before,
+                    (time.monotonic() - self.started_at) / 60,
+                    censored=True,
+                )
             await self._notify(
                 "Не удалось достичь безопасной температуры для запуска двигателя"
             )
@@ -157,15 +387,78 @@ class ColdStart:
         logger.info("Включаем подогреватель двигателя")
         if not self.__test:
             await self.pandora.start_heater()
-        await asyncio.sleep(180)
+        return await self._measure_heater()
+
+    async def _measure_heater(self) -> bool:
+        # Серия замеров напряжения до уверенного результата или таймаута
+        self.detector.reset_samples()
+        self._reported = self.pandora.poller.device_report(self.pandora.device_id)
+        await wait_until(
+            lambda: self.detector.verdict().status != HEATER_INCONCLUSIVE,
+            self._sample_voltage,
+            timeout=self.heater_timeout,
+            interval=self._sample_interval,
+            max_interval=self._sample_interval,
+        )
         return await self._check_heater()
 
-    async def _check_heater(self) -> bool:
-        self.heater_on = False
+    @property
+    def _sample_interval(self) -> float:
+        # Чаще окна дедупликации 255 новый ответ устройства не придёт
+        return max(self.heater_sample_interval, settings.poller.wake_dedup)
+
+    async def _new_reading(self) -> bool:
+        """Запрос статуса; True, если устройство прислало новый ответ.
+
+        Повторное чтение того же ответа не считается отдельным замером.
+        """
         await self.pandora.check()
-        delta_v = self.pandora.state.voltage_before - self.pandora.state.voltage
-        if delta_v >= 0.2:
-            self.heater_on = True
+        report = self.pandora.poller.device_report(self.pandora.device_id)
+        if report == self._reported:
+            return False
+        self._reported = report
+        return True
+
+    async def _collect_baseline(self):
+        """Добирает замеры напряжения до команды подогревателю.
+
+        Если за отведённые попытки замеров не хватило, база остаётся как есть.
+        """
+        self._reported = self.pandora.poller.device_report(self.pandora.device_id)
+        for _ in range(self.heater_baseline_samples * 2):
+            if len(self.detector.baseline) >= self.heater_baseline_samples:
+                return
+            await asyncio.sleep(self._sample_interval)
+            if await self._new_reading():
+                self.detector.add_baseline(self.pandora.state.voltage)
+        logger.warning(
+            "Замеров напряжения до команды: %d из %d",
+            len(self.detector.baseline),
+            self.heater_baseline_samples,
+        )
+
+    async def _sample_voltage(self):
+        if await self._new_reading():
+            self.detector.add_sample(self.pandora.state.voltage)
+
+    def _is_warmed_up(self) -> bool:
+        return self.pandora.state.engine_temp >= 20 or bool(
+            self.pandora.state.engine_on
+        )
+
+    async def _check_heater(self) -> bool:
+        verdict = self.detector.verdict()
+        logger.info("Определение подогревателя: %s", verdict)
+        self.heater_checked = True
+        self.heater_drop = verdict.drop
+        if verdict.status == HEATER_INCONCLUSIVE:
+            # Серия не дала уверенного ответа — решаем по медианному падению
+            self.heater_on = (
+                verdict.drop is not None and verdict.drop >= self.detector.threshold
+            )
+        else:
+            self.heater_on = verdict.status == HEATER_ON
+        if self.heater_on:
             logger.info("Подогреватель работает корректно")
         else:
             logger.warning("Подогреватель не включился")
@@ -176,20 +469,38 @@ class ColdStart:
     # ---------------------------
     async def _ready_to_start(self):
         logger.info("Двигатель достиг безопасной температуры — запускаем")
+        self.warmup_minutes = (time.monotonic() - self.started_at) / 60
+        if not self.__test:
+            # Время прогрева — для прогноза опережения запуска по расписанию
+            s = self.pandora.state
+            warmup_model.add(
+                s.out_temp, s.engine_temp_before, s.voltage_before, self.warmup_minutes
+            )
         await tg_msg.msg_ready(self.pandora.state)
         await self._safe_start_engine()
 
     # ---------------------------
     # Вспомогательные методы
     # ---------------------------
+    async def _wait_for(self, predicate, timeout: float) -> bool:
+        # Промежуточные опросы берут свежие данные общего фонового опроса
+        return await wait_until(
+            predicate,
+            lambda: self.pandora.refresh(max_age=settings.poller.active_interval),
+            timeout=timeout,
+            interval=self.poll_interval,
+            max_interval=self.poll_max_interval,
+        )
+
     async def _safe_start_engine(self):
+        self.phase = "запуск двигателя"
+        self._checkpoint(STAGE_START)
         if not self.__test:
             await self.pandora.start_engine()
 
-    @staticmethod
-    async def _notify(text: str):
+    async def _notify(self, text: str):
         logger.info(text)
-        await bot.send_message(chat_id=settings.telegram.chat_id, text=text)
+        await tg_msg.msg_text(text, self.pandora.state)
 
     def _log_state(self):
         s = self.pandora.state
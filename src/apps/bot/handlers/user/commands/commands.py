@@ -1,12 +1,21 @@
 import logging
+import time
 
 from aiogram import Dispatcher, Router, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message
 
-from apps.algoritm import ColdStart
+from apps.charts import charts
+from apps.fleet import run_accounts
+from apps.report import report_text
+from apps.jobs import jobs, Job
+from apps.pandora.poller import TelemetryPoller
+from apps.runs import AlreadyRunning, runs
+from apps.pandora.api import Pandora
 from apps.bot.keyboards.main import start_keyboard
 from core import settings
+from core.tg_outbox import outbox
+import core.tg_msg as tg_msg
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -15,7 +24,7 @@ logger = logging.getLogger(__name__)
 # --- Обработчик команды /start ---
 @router.message(Command("start"))
 async def cmd_start(msg: Message):
-    if msg.from_user.id in settings.telegram.admin_chat_ids:
+    if settings.accounts_for_user(msg.from_user.id):
         await msg.answer(
             "Привет! 👋\nНажми кнопку ниже, чтобы выполнить холодный запуск двигателя.",
             reply_markup=start_keyboard,
@@ -25,20 +34,219 @@ async def cmd_start(msg: Message):
 # --- Обработчик кнопки ---
 @router.message(F.text == "🚗 Старт двигателя")
 async def cmd_engine_start(msg: Message):
-    if msg.from_user.id in settings.telegram.admin_chat_ids:
-        await msg.answer("⏳ Начинаю процедуру холодного запуска...")
+    if settings.accounts_for_user(msg.from_user.id):
+        await _run_cold_start(msg, None)
 
+
+# --- /engine_start [аккаунт:][цель]: all, ID авто, группа или список через запятую ---
+@router.message(Command("engine_start"))
+async def cmd_engine_start_target(msg: Message, command: CommandObject):
+    if settings.accounts_for_user(msg.from_user.id):
+        await _run_cold_start(msg, command.args)
+
+
+async def _run_cold_start(msg: Message, target: str | None):
+    accounts = settings.accounts_for_user(msg.from_user.id)
+
+    async def work(job: Job):
+        try:
+            # Авто, которое уже запускается, не запускаем повторно
+            outcome = await run_accounts(accounts, target, join=False, job_id=job.id)
+        except ValueError as e:
+            await msg.answer(f"⚠️ {e}")
+            return
+        await _report_outcome(msg, outcome, len(accounts))
+
+    # Запуск идёт в фоне, обработчик сразу освобождается
+    job = jobs.submit(
+        "Холодный запуск" + (f" ({target})" if target else ""),
+        work,
+        owner=msg.from_user.id,
+        accounts=[a.name for a in accounts],
+    )
+    await msg.answer(
+        f"⏳ Начинаю процедуру холодного запуска (задача #{job.id}).\n"
+        f"Ход запуска — /jobs, отмена — /cancel {job.id}"
+    )
+
+
+async def _report_outcome(msg: Message, outcome: dict, accounts_count: int):
+    failed = []
+    running = []
+    started = 0
+    for name, result in outcome.items():
+        prefix = f"{name}:" if accounts_count > 1 else ""
+        if isinstance(result, BaseException):
+            failed.append(name)
+            continue
+        started += len(result)
+        for device_id, e in result.items():
+            if isinstance(e, AlreadyRunning):
+                running.append(f"{prefix}{device_id} — {e.run.cold_start.progress}")
+            elif e:
+                failed.append(f"{prefix}{device_id}")
+
+    if running:
+        await msg.answer("⏳ Холодный запуск уже идёт:\n" + "\n".join(running))
+        if len(running) == started and not failed:
+            return
+
+    if not started and not failed:
+        await msg.answer("⚠️ Не найдено ни одного авто для запуска.")
+    elif failed:
+        await msg.answer(
+            f"⚠️ Произошла ошибка при запуске двигателя: {', '.join(failed)}"
+        )
+    else:
+        await msg.answer("✅ Процедура холодного запуска завершена.")
+
+
+# --- /status: показания авто из кэша общего опроса ---
+@router.message(Command("status"))
+@router.message(F.text == "📊 Статус")
+async def cmd_status(msg: Message):
+    accounts = settings.accounts_for_user(msg.from_user.id)
+    if not accounts:
+        return
+    ttl = settings.poller.status_ttl
+    blocks = []
+    for account in accounts:
+        poller = TelemetryPoller.for_account(account)
+        if not poller.states:
+            try:
+                # Кэша ещё нет — один запрос /updates без команды устройству
+                await poller.fetch()
+            except Exception as e:
+                logger.warning("Не удалось обновить статус %s: %s", account.name, e)
+                blocks.append(f"🚘 {account.name}: ⚠️ недоступен")
+                continue
+        for device_id, state in sorted(poller.states.items()):
+            if time.time() - poller.device_seen_at(device_id) > ttl:
+                # Ответ из кэша сразу, статус устройства обновится в фоне
+                poller.request_status(device_id)
+            text = tg_msg.status_text(state, poller.device_seen_at(device_id))
+            run = runs.get(account, device_id)
+            if run is not None:
+                text += f"\n⏳ Холодный запуск: {run.cold_start.progress}"
+            blocks.append(text)
+    await msg.answer("\n\n".join(blocks) or "Нет данных.", parse_mode="HTML")
+
+
+# --- /report [дней]: статистика холодных запусков ---
+@router.message(Command("report"))
+async def cmd_report(msg: Message, command: CommandObject):
+    accounts = settings.accounts_for_user(msg.from_user.id)
+    if not accounts:
+        return
+    days = int(command.args) if command.args and command.args.isdigit() else 180
+    # Только авто аккаунтов пользователя
+    device_ids = []
+    for account in accounts:
+        try:
+            async with Pandora(account=account) as pandora:
+                device_ids += [d.get("id") for d in await pandora.devices()]
+        except Exception as e:
+            logger.warning("Не удалось получить авто %s: %s", account.name, e)
+    await msg.answer(report_text(days, device_ids))
+
+
+# --- /chart: график последнего запуска каждого авто ---
+@router.message(Command("chart"))
+async def cmd_chart(msg: Message):
+    accounts = settings.accounts_for_user(msg.from_user.id)
+    if not accounts:
+        return
+    sent = 0
+    for account in accounts:
+        try:
+            async with Pandora(account=account) as pandora:
+                devices = await pandora.devices()
+        except Exception as e:
+            logger.warning("Не удалось получить авто %s: %s", account.name, e)
+            continue
+        for device in devices:
+            png = await charts.last_run(device.get("id"))
+            if png is None:
+                continue
+            # Через очередь отправки: общий лимит частоты сообщений Telegram
+            await outbox.send_photo(
+                msg.chat.id,
+                png,
+                f"📈 {device.get('name') or device.get('id')}",
+                parse_mode=None,
+            )
+            sent += 1
+    if not sent:
+        await msg.answer("Нет данных о запусках.")
+
+
+# --- /jobs: идущие и недавние холодные запуски ---
+@router.message(Command("jobs"))
+async def cmd_jobs(msg: Message):
+    accounts = settings.accounts_for_user(msg.from_user.id)
+    if not accounts:
+        return
+    user_jobs = jobs.jobs([a.name for a in accounts])
+    if not user_jobs:
+        await msg.answer("Нет запущенных задач.")
+        return
+    await msg.answer("\n\n".join(job.describe() for job in user_jobs[-10:]))
+
+
+# --- /cancel [номер задачи]: отмена холодного запуска ---
+@router.message(Command("cancel"))
+async def cmd_cancel(msg: Message, command: CommandObject):
+    accounts = settings.accounts_for_user(msg.from_user.id)
+    if not accounts:
+        return
+    active = jobs.active([a.name for a in accounts])
+    if command.args:
+        job = jobs.get(command.args.strip())
+        targets = [job] if job in active else []
+        if not targets:
+            await msg.answer(f"⚠️ Нет активной задачи #{command.args.strip()}")
+            return
+    else:
+        targets = active
+    if not targets:
+        await msg.answer("Нет активных задач.")
+        return
+    for job in targets:
+        await jobs.cancel(job)
+    await msg.answer(
+        "⛔ Отменено: " + ", ".join(f"#{job.id} {job.title}" for job in targets)
+    )
+
+
+# --- /devices: список авто аккаунтов ---
+@router.message(Command("devices"))
+async def cmd_devices(msg: Message):
+    accounts = settings.accounts_for_user(msg.from_user.id)
+    if not accounts:
+        return
+    lines = []
+    for account in accounts:
         try:
-            await ColdStart().begin()
-            await msg.answer("✅ Процедура холодного запуска завершена.")
+            async with Pandora(account=account) as pandora:
+                devices = await pandora.devices()
         except Exception as e:
-            logger.exception("Ошибка при холодном запуске: %s", e)
-            await msg.answer("⚠️ Произошла ошибка при запуске двигателя.")
+            logger.warning("Не удалось получить авто аккаунта %s: %s", account.name, e)
+            lines.append(f"🚘 {account.name}: ⚠️ недоступен")
+            continue
+        lines.append(f"🚘 Авто на аккаунте {account.name}:")
+        for device in devices:
+            lines.append(f"{device.get('id')} — {device.get('name') or 'без названия'}")
+    groups = settings.fleet.groups
+    if groups:
+        lines.append("\nГруппы:")
+        for name, ids in groups.items():
+            lines.append(f"{name}: {', '.join(map(str, ids))}")
+    await msg.answer("\n".join(lines))
 
 
 @router.message(F.forward_from | F.forward_from_chat)
 async def handle_forwarded_message(msg: Message):
-    if msg.from_user.id not in settings.telegram.admin_chat_ids:
+    if not settings.accounts_for_user(msg.from_user.id):
         return
     # Проверяем, является ли сообщение пересланным
     if msg.forward_from_chat or msg.forward_from:
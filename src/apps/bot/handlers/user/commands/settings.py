@@ -1,5 +1,6 @@
 import re
 import logging
+from typing import Optional
 from aiogram import Dispatcher, Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
@@ -10,6 +11,8 @@ from apps.bot.keyboards.schedule.day import schedule_day_kb
 from apps.bot.keyboards.schedule.main import schedule_main_kb
 from apps.utils.schedule import update_task
 from apps.utils.storage import get_schedule, update_schedule  # изменено
+from core import settings
+from core.config import Account
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -26,6 +29,30 @@ DAY_NAMES = {
 }
 
 
+# Выбранный пользователем аккаунт (если их несколько)
+_selected_accounts: dict[int, str] = {}
+
+
+def _user_accounts(user_id: int) -> list[Account]:
+    """Аккаунты пользователя; без прав — пустой список."""
+    return settings.accounts_for_user(user_id)
+
+
+def _user_account(user_id: int) -> Optional[Account]:
+    accounts = _user_accounts(user_id)
+    if not accounts:
+        return None
+    name = _selected_accounts.get(user_id)
+    return next((a for a in accounts if a.name == name), accounts[0])
+
+
+def _schedule_kb(user_id: int):
+    accounts = _user_accounts(user_id)
+    if len(accounts) < 2:
+        return schedule_main_kb()
+    return schedule_main_kb([a.name for a in accounts], _user_account(user_id).name)
+
+
 # --- FSM для ввода времени ---
 class ScheduleEditTime(StatesGroup):
     waiting_time = State()
@@ -45,14 +72,24 @@ async def on_schedule_button(msg: Message):
 
 # --- Общая функция вывода расписания ---
 async def show_schedule(msg: Message):
-    schedule = get_schedule()
-    text = format_schedule_table(schedule)
-    await msg.answer(text, reply_markup=schedule_main_kb(), parse_mode="Markdown")
+    account = _user_account(msg.from_user.id)
+    if account is None:
+        return
+    text = _format_account_schedule(msg.from_user.id, account)
+    await msg.answer(
+        text, reply_markup=_schedule_kb(msg.from_user.id), parse_mode="Markdown"
+    )
 
 
-def format_schedule_table(schedule: dict) -> str:
+def _format_account_schedule(user_id: int, account: Account) -> str:
+    title = account.name if len(_user_accounts(user_id)) > 1 else None
+    return format_schedule_table(get_schedule(account), title)
+
+
+def format_schedule_table(schedule: dict, title: str | None = None) -> str:
+    header = f"📅 *Текущее расписание ({title}):*\n" if title else None
     lines = [
-        "📅 *Текущее расписание:*\n",
+        header or "📅 *Текущее расписание:*\n",
         "```",
         f"{'День':<14} | {'Время':<5} | Статус",
         "-" * 28,
@@ -67,11 +104,32 @@ def format_schedule_table(schedule: dict) -> str:
     return "\n".join(lines)
 
 
+# --- Переключение аккаунта ---
+@router.callback_query(F.data.startswith("sch_acc_"))
+async def cb_select_account(call: CallbackQuery):
+    accounts = _user_accounts(call.from_user.id)
+    index = int(call.data.split("_")[-1])
+    if index >= len(accounts):
+        await call.answer()
+        return
+    _selected_accounts[call.from_user.id] = accounts[index].name
+
+    text = _format_account_schedule(call.from_user.id, accounts[index])
+    await call.message.edit_text(
+        text, reply_markup=_schedule_kb(call.from_user.id), parse_mode="Markdown"
+    )
+    await call.answer()
+
+
 # --- Обработка выбора дня недели ---
 @router.callback_query(F.data.startswith("sch_day_"))
 async def cb_show_day(call: CallbackQuery):
     day = call.data.split("_")[-1]
-    schedule = get_schedule()
+    account = _user_account(call.from_user.id)
+    if account is None:
+        await call.answer()
+        return
+    schedule = get_schedule(account)
     day_data = schedule.get(day, {"enabled": False, "time": None})
 
     enabled = day_data["enabled"]
@@ -92,12 +150,18 @@ async def cb_show_day(call: CallbackQuery):
 @router.callback_query(F.data.startswith("sch_toggle_"))
 async def cb_toggle_day(call: CallbackQuery):
     day = call.data.split("_")[-1]
-    schedule = get_schedule()
+    account = _user_account(call.from_user.id)
+    if account is None:
+        await call.answer()
+        return
+    schedule = get_schedule(account)
     new_enabled = not schedule[day]["enabled"]
 
-    # Обновляем глобальное расписание и пересоздаём задачу
-    update_schedule(day, enabled=new_enabled, time=schedule[day]["time"])
-    update_task(day, enabled=new_enabled, time=schedule[day]["time"])
+    # Обновляем расписание аккаунта и пересоздаём задачу
+    update_schedule(
+        day, enabled=new_enabled, time=schedule[day]["time"], account=account
+    )
+    update_task(day, enabled=new_enabled, time=schedule[day]["time"], account=account)
 
     time_display = schedule[day]["time"] or "—"
     text = (
@@ -115,6 +179,9 @@ async def cb_toggle_day(call: CallbackQuery):
 # --- Изменение времени ---
 @router.callback_query(F.data.startswith("sch_edit_"))
 async def cb_edit_time(call: CallbackQuery, state: FSMContext):
+    if _user_account(call.from_user.id) is None:
+        await call.answer()
+        return
     day = call.data.split("_")[-1]
     await state.set_state(ScheduleEditTime.waiting_time)
     await state.update_data(day=day)
@@ -138,9 +205,13 @@ async def msg_set_time(msg: Message, state: FSMContext):
     data = await state.get_data()
     day = data["day"]
 
-    # Обновляем глобальное расписание и пересоздаём задачу
-    update_schedule(day, enabled=True, time=time_str)
-    update_task(day, enabled=True, time=time_str)
+    # Обновляем расписание аккаунта и пересоздаём задачу
+    account = _user_account(msg.from_user.id)
+    if account is None:
+        await state.clear()
+        return
+    update_schedule(day, enabled=True, time=time_str, account=account)
+    update_task(day, enabled=True, time=time_str, account=account)
 
     await msg.answer(
         f"✅ Время для *{DAY_NAMES[day]}* установлено: `{time_str}`",
@@ -152,14 +223,16 @@ async def msg_set_time(msg: Message, state: FSMContext):
 # --- Возврат к списку дней ---
 @router.callback_query(F.data == "sch_back_days")
 async def cb_back_days(call: CallbackQuery):
-    schedule = get_schedule()
-
     # Формируем таблицу
-    text = format_schedule_table(schedule)
+    account = _user_account(call.from_user.id)
+    if account is None:
+        await call.answer()
+        return
+    text = _format_account_schedule(call.from_user.id, account)
 
     # Обновляем сообщение
     await call.message.edit_text(
-        text, reply_markup=schedule_main_kb(), parse_mode="Markdown"
+        text, reply_markup=_schedule_kb(call.from_user.id), parse_mode="Markdown"
     )
     await call.answer()
 
@@ -6,6 +6,9 @@ start_keyboard = ReplyKeyboardMarkup(
             KeyboardButton(text="🚗 Старт двигателя"),
             KeyboardButton(text="🕒 Расписание"),
         ],
+        [
+            KeyboardButton(text="📊 Статус"),
+        ],
     ],
     resize_keyboard=True,
 )
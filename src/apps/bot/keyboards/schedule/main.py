@@ -1,21 +1,33 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 
-def schedule_main_kb() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
+def schedule_main_kb(
+    accounts: list[str] | None = None, current: str | None = None
+) -> InlineKeyboardMarkup:
+    keyboard = [
+        [
+            InlineKeyboardButton(text="Пн", callback_data="sch_day_mon"),
+            InlineKeyboardButton(text="Вт", callback_data="sch_day_tue"),
+            InlineKeyboardButton(text="Ср", callback_data="sch_day_wed"),
+        ],
+        [
+            InlineKeyboardButton(text="Чт", callback_data="sch_day_thu"),
+            InlineKeyboardButton(text="Пт", callback_data="sch_day_fri"),
+        ],
+        [
+            InlineKeyboardButton(text="Сб", callback_data="sch_day_sat"),
+            InlineKeyboardButton(text="Вс", callback_data="sch_day_sun"),
+        ],
+    ]
+    # Переключатель аккаунтов, если пользователь управляет несколькими
+    if accounts:
+        keyboard.append(
             [
-                InlineKeyboardButton(text="Пн", callback_data="sch_day_mon"),
-                InlineKeyboardButton(text="Вт", callback_data="sch_day_tue"),
-                InlineKeyboardButton(text="Ср", callback_data="sch_day_wed"),
-            ],
-            [
-                InlineKeyboardButton(text="Чт", callback_data="sch_day_thu"),
-                InlineKeyboardButton(text="Пт", callback_data="sch_day_fri"),
-            ],
-            [
-                InlineKeyboardButton(text="Сб", callback_data="sch_day_sat"),
-                InlineKeyboardButton(text="Вс", callback_data="sch_day_sun"),
-            ],
-        ]
-    )
+                InlineKeyboardButton(
+                    text=f"• {name}" if name == current else name,
+                    callback_data=f"sch_acc_{index}",
+                )
+                for index, name in enumerate(accounts)
+            ]
+        )
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
@@ -0,0 +1,122 @@
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple, Set
+
+from apps.pandora.state import PandoraState
+from apps.utils.png import render_chart
+from apps.utils.telemetry import telemetry
+from core import settings
+import core.tg_msg as tg_msg
+
+logger = logging.getLogger(__name__)
+
+READY_TEMP = 20  # безопасная температура запуска двигателя — пунктир на графике
+
+
+def run_id(device_id: int, started_at: float) -> str:
+    return f"{device_id}-{int(started_at)}"
+
+
+class ChartRenderer:
+    """Графики запусков: построение в пуле процессов и кэш готовых PNG.
+
+    Построение изображения на чистом Python занимает процессор, поэтому
+    выполняется вне цикла событий бота. Готовый график хранится по ключу
+    (ID запуска, версия), где версия — последнее показание: повторный
+    запрос неизменившегося запуска отдаётся из кэша, а одновременные
+    запросы одного графика строятся один раз.
+    """
+
+    def __init__(self):
+        self._executor: Optional[concurrent.futures.Executor] = None
+        self._cache: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+        self._rendering: Dict[Tuple[str, int], asyncio.Future] = {}
+        self._sending: Set[asyncio.Task] = set()
+
+    def _pool(self) -> concurrent.futures.Executor:
+        if self._executor is None:
+            # spawn: дочерний процесс не наследует цикл событий и сессии бота
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=settings.charts.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def render(
+        self, device_id: int, start: float, end: Optional[float] = None
+    ) -> Optional[bytes]:
+        """PNG показаний устройства за период запуска или None без данных."""
+        samples = telemetry.query(device_id, start, end)
+        if len(samples) < 2:
+            return None
+        key = (run_id(device_id, start), samples[-1].ts)
+        png = self._cache.get(key)
+        if png is not None:
+            self._cache.move_to_end(key)
+            return png
+        if key in self._rendering:
+            return await asyncio.shield(self._rendering[key])
+
+        future = asyncio.get_running_loop().run_in_executor(
+            self._pool(),
+            render_chart,
+            [s.ts for s in samples],
+            [s.engine_temp for s in samples],
+            [s.voltage for s in samples],
+            READY_TEMP,
+            settings.charts.width,
+            settings.charts.height,
+        )
+        self._rendering[key] = future
+        started = time.perf_counter()
+        try:
+            png = await asyncio.shield(future)
+        except concurrent.futures.BrokenExecutor:
+            # Процесс пула завершился аварийно — следующий запрос создаст новый пул
+            self._executor = None
+            raise
+        finally:
+            self._rendering.pop(key, None)
+        logger.debug(
+            "График %s построен за %.2f сек", key[0], time.perf_counter() - started
+        )
+        self._cache[key] = png
+        while len(self._cache) > settings.charts.cache_size:
+            self._cache.popitem(last=False)
+        return png
+
+    async def last_run(self, device_id: int) -> Optional[bytes]:
+        """График последнего запуска устройства."""
+        run = telemetry.last_run(device_id)
+        if run is None:
+            return None
+        return await self.render(device_id, run["started_at"], run["finished_at"])
+
+    def send_run(self, state: PandoraState, started_at: float, caption: str = ""):
+        """Строит и отправляет график запуска в фоне."""
+
+        async def send():
+            try:
+                png = await self.render(state.device_id, started_at)
+                if png is not None:
+                    await tg_msg.msg_chart(png, state, caption)
+            except Exception as e:
+                logger.warning("График запуска не отправлен: %s", e)
+
+        task = asyncio.ensure_future(send())
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+    async def close(self, timeout: float = 10):
+        if self._sending:
+            await asyncio.wait(list(self._sending), timeout=timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+charts = ChartRenderer()
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Dict, Any, List, Union, Iterable
+
+import aiohttp
+
+from apps.algoritm import ColdStart
+from apps.pandora.api import Pandora
+from apps.pandora.poller import TelemetryPoller
+from apps.jobs import jobs
+from apps.runs import runs, AlreadyRunning
+from apps.utils.checkpoint import checkpoints
+from apps.utils.warmup import warmup_model
+from core import settings
+from core.config import Account
+
+logger = logging.getLogger(__name__)
+
+# Цель запуска: "all", ID устройства, имя группы, "id1,group2" или их список
+Target = Union[None, int, str, Iterable[Union[int, str]]]
+
+
+def resolve_target(target: Target, devices: List[Dict[str, Any]]) -> List[int]:
+    """Преобразует цель запуска в список device_id авто аккаунта."""
+    known = [d.get("id") for d in devices]
+    if target is None:
+        target = settings.fleet.default_target
+
+    if isinstance(target, str) and "," in target:
+        target = [t.strip() for t in target.split(",") if t.strip()]
+
+    if not isinstance(target, (str, int)):
+        result: List[int] = []
+        for item in target:
+            for device_id in resolve_target(item, devices):
+                if device_id not in result:
+                    result.append(device_id)
+        return result
+
+    if target == "all":
+        return known
+    if target in settings.fleet.groups:
+        ids = settings.fleet.groups[target]
+    elif isinstance(target, int) or target.isdigit():
+        ids = [int(target)]
+    else:
+        raise ValueError(f"Неизвестная цель запуска: {target}")
+
+    missing = [i for i in ids if i not in known]
+    if missing:
+        # Группа может объединять авто разных аккаунтов
+        logger.debug("Устройства %s не найдены на аккаунте", missing)
+    return [i for i in ids if i in known]
+
+
+async def run_fleet(
+    target: Target = None,
+    test: bool = False,
+    account: Optional[Account] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+    join: bool = True,
+    job_id: Optional[str] = None,
+    ready_at: Optional[float] = None,
+) -> Dict[int, Optional[BaseException]]:
+    """Холодный запуск для нескольких авто аккаунта одновременно.
+
+    Все запуски используют общую HTTP-сессию и контекст авторизации,
+    одновременно выполняется не более settings.fleet.concurrency запусков.
+    Если авто уже запускается, вызов ждёт идущий запуск, а при
+    join=False получает для него AlreadyRunning.
+    С ready_at (unix) запуск каждого авто начинается с опережением
+    по прогнозу прогрева, чтобы двигатель был запущен к этому времени.
+    Возвращает ошибку (или None) по каждому device_id.
+    """
+    async with Pandora(session=session, account=account) as pandora:
+        account = pandora.account
+        device_ids = resolve_target(target, await pandora.devices())
+        delays = await _start_delays(account, device_ids, ready_at)
+    logger.info("Холодный запуск [%s] для устройств: %s", account.name, device_ids)
+
+    semaphore = asyncio.Semaphore(settings.fleet.concurrency)
+
+    async def run_one(device_id: int):
+        run = runs.get(account, device_id)
+        if run is not None:
+            if not join:
+                raise AlreadyRunning(run)
+            await runs.run(run.cold_start, account, device_id)
+            return
+        cold_start = ColdStart(
+            test=test, device_id=device_id, session=session, account=account
+        )
+        # Запуск с опережением регистрируется до паузы: авто сразу занято
+        await runs.run(
+            cold_start,
+            account,
+            device_id,
+            join,
+            job_id,
+            delay=delays.get(device_id, 0),
+            limit=semaphore,
+        )
+
+    results = await asyncio.gather(
+        *(run_one(device_id) for device_id in device_ids),
+        return_exceptions=True,
+    )
+
+    outcome = {}
+    for device_id, result in zip(device_ids, results):
+        if isinstance(result, AlreadyRunning):
+            logger.info("Запуск [%s] %s %s", account.name, device_id, result)
+            outcome[device_id] = result
+        elif isinstance(result, BaseException):
+            logger.error(
+                "Ошибка холодного запуска [%s] %s: %r",
+                account.name,
+                device_id,
+                result,
+                exc_info=result,
+            )
+            outcome[device_id] = result
+        else:
+            outcome[device_id] = None
+    return outcome
+
+
+async def _start_delays(
+    account: Account, device_ids: List[int], ready_at: Optional[float]
+) -> Dict[int, float]:
+    """Паузы до начала запуска авто, чтобы двигатель был запущен к ready_at."""
+    if ready_at is None:
+        return {}
+    poller = TelemetryPoller.for_account(account)
+    try:
+        # Текущие показания без команды устройству
+        await poller.fetch(max_age=settings.poller.status_ttl)
+    except Exception as e:
+        logger.warning("Нет показаний для прогноза прогрева: %s", e)
+    delays = {}
+    for device_id in device_ids:
+        state = poller.latest(device_id)
+        minutes = (
+            warmup_model.predict(state.out_temp, state.engine_temp, state.voltage)
+            if state is not None
+            else warmup_model.predict(None, None, None)
+        )
+        delays[device_id] = max(ready_at - minutes * 60 - time.time(), 0.0)
+        logger.info(
+            "Прогноз прогрева [%s] %s: %.0f мин, запуск через %.0f мин",
+            account.name,
+            device_id,
+            minutes,
+            delays[device_id] / 60,
+        )
+    return delays
+
+
+async def run_accounts(
+    accounts: List[Account],
+    target: Target = None,
+    test: bool = False,
+    join: bool = True,
+    job_id: Optional[str] = None,
+) -> Dict[str, Union[Dict[int, Optional[BaseException]], BaseException]]:
+    """Холодный запуск по нескольким аккаунтам на общем пуле соединений.
+
+    Аккаунты выполняются независимо: ошибка или медленный ответ одного
+    не задерживает остальные. Цель вида "<аккаунт>:<цель>" ограничивает
+    запуск одним аккаунтом.
+    """
+    if isinstance(target, str) and ":" in target:
+        name, target = target.split(":", 1)
+        target = target or None
+        accounts = [a for a in accounts if a.name == name]
+        if not accounts:
+            raise ValueError(f"Неизвестный аккаунт: {name}")
+
+    results = await asyncio.gather(
+        *(
+            run_fleet(target, test, account, join=join, job_id=job_id)
+            for account in accounts
+        ),
+        return_exceptions=True,
+    )
+    for account, result in zip(accounts, results):
+        if isinstance(result, BaseException):
+            logger.error("Ошибка аккаунта %s: %r", account.name, result)
+    return {account.name: result for account, result in zip(accounts, results)}
+
+
+def resume_cold_starts() -> int:
+    """Продолжает холодные запуски, прерванные перезапуском процесса.
+
+    Каждый запуск продолжается отдельной фоновой задачей с сохранённого
+    этапа. Возвращает число продолжаемых запусков.
+    """
+    resumed = 0
+    for saved in checkpoints.pending(settings.resume.max_age):
+        try:
+            account = settings.get_account(saved["account"])
+        except ValueError:
+            logger.warning("Аккаунт %s не найден — запуск не продолжен", saved)
+            checkpoints.remove(checkpoints.key(saved["account"], saved["device_id"]))
+            continue
+        device_id = saved["device_id"]
+        cold_start = ColdStart(
+            test=saved.get("test", False),
+            device_id=device_id,
+            account=account,
+            resume=saved,
+        )
+        logger.info(
+            "Продолжаем холодный запуск [%s] %s с этапа %s",
+            account.name,
+            device_id,
+            saved.get("stage"),
+        )
+        jobs.submit(
+            "Продолжение холодного запуска",
+            lambda job, cs=cold_start, a=account, d=device_id: runs.run(
+                cs, a, d, job_id=job.id
+            ),
+            accounts=[account.name],
+        )
+        resumed += 1
+    return resumed
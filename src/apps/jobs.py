@@ -0,0 +1,129 @@
+import asyncio
+import contextlib
+import itertools
+import logging
+import time
+from typing import Optional, Dict, List, Callable, Awaitable, Any
+
+from apps.runs import runs, ActiveRun
+
+logger = logging.getLogger(__name__)
+
+# Статусы фоновой задачи
+RUNNING = "выполняется"
+DONE = "завершена"
+CANCELLED = "отменена"
+FAILED = "ошибка"
+
+
+class Job:
+    """Фоновая задача холодного запуска (одно или несколько авто)."""
+
+    def __init__(
+        self,
+        job_id: str,
+        title: str,
+        owner: Optional[int] = None,
+        accounts: Optional[List[str]] = None,
+    ):
+        self.id = job_id
+        self.title = title
+        self.owner = owner  # пользователь бота; None — расписание
+        self.accounts = accounts or []
+        self.created_at = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def status(self) -> str:
+        if self.task is None or not self.task.done():
+            return RUNNING
+        if self.task.cancelled():
+            return CANCELLED
+        return FAILED if self.task.exception() else DONE
+
+    @property
+    def runs(self) -> List[ActiveRun]:
+        """Идущие запуски авто этой задачи."""
+        return runs.for_job(self.id)
+
+    def describe(self) -> str:
+        minutes = int((time.monotonic() - self.created_at) // 60)
+        lines = [f"#{self.id} {self.title} — {self.status}, {minutes} мин"]
+        for run in self.runs:
+            name = run.cold_start.pandora and run.cold_start.pandora.state.name
+            device = name or run.device_id
+            lines.append(f"  🚘 {device}: {run.cold_start.progress}")
+        return "\n".join(lines)
+
+
+class JobManager:
+    """Холодные запуски как фоновые задачи с ходом выполнения и отменой.
+
+    Обработчик бота ставит задачу и сразу отвечает, а ход запуска
+    доступен по /jobs и отменяется по /cancel.
+    """
+
+    def __init__(self, keep: int = 20):
+        self._jobs: Dict[str, Job] = {}
+        self._ids = itertools.count(1)
+        self._keep = keep  # сколько завершённых задач хранить для /jobs
+
+    def submit(
+        self,
+        title: str,
+        work: Callable[[Job], Awaitable[Any]],
+        owner: Optional[int] = None,
+        accounts: Optional[List[str]] = None,
+    ) -> Job:
+        """Запускает work(job) в фоне и сразу возвращает задачу."""
+        job = Job(str(next(self._ids)), title, owner, accounts)
+        job.task = asyncio.ensure_future(work(job))
+        job.task.add_done_callback(lambda _: self._finished(job))
+        self._jobs[job.id] = job
+        logger.info("Задача #%s «%s» запущена", job.id, title)
+        return job
+
+    def _finished(self, job: Job):
+        if not job.task.cancelled() and job.task.exception():
+            logger.error(
+                "Задача #%s завершилась с ошибкой",
+                job.id,
+                exc_info=job.task.exception(),
+            )
+        else:
+            logger.info("Задача #%s: %s", job.id, job.status)
+        done = [j for j in self._jobs.values() if j.status != RUNNING]
+        for old in done[: max(len(done) - self._keep, 0)]:
+            self._jobs.pop(old.id, None)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id.lstrip("#"))
+
+    def jobs(self, accounts: Optional[List[str]] = None) -> List[Job]:
+        """Задачи по указанным аккаунтам (все, если не указаны)."""
+        return [
+            job
+            for job in self._jobs.values()
+            if accounts is None or set(job.accounts) & set(accounts)
+        ]
+
+    def active(self, accounts: Optional[List[str]] = None) -> List[Job]:
+        return [job for job in self.jobs(accounts) if job.status == RUNNING]
+
+    async def cancel(self, job: Job) -> bool:
+        """Отменяет задачу; текущий этап запуска прерывается."""
+        if job.status != RUNNING:
+            return False
+        logger.info("Отмена задачи #%s", job.id)
+        job.task.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await job.task
+        return True
+
+    async def shutdown(self):
+        """Отменяет все задачи при остановке приложения."""
+        for job in self.active():
+            await self.cancel(job)
+
+
+jobs = JobManager()
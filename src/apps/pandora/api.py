@@ -1,48 +1,64 @@
 import asyncio
 import logging
+from typing import Optional
 
 from apps.pandora.base import PandoraBase
+from apps.pandora.command_queue import STATUS_COMMAND
+from apps.pandora.commands import TrackedCommand
+from apps.pandora.poller import TelemetryPoller
+from apps.pandora.state import PandoraState
+
+__all__ = ("Pandora", "PandoraState")
 
 logger = logging.getLogger(__name__)
 
 
-class PandoraState:
-    """Объект для хранения состояния Pandora."""
+class Pandora(PandoraBase):
+    def __init__(self, device_id: Optional[int] = None, session=None, account=None):
+        super().__init__(device_id, session, account)
+        self.state = PandoraState()
+        self.state.chat_id = self.account.chat_id
+        # Общий опрос /updates аккаунта: запросы разных потребителей объединяются
+        self.poller = TelemetryPoller.for_account(self.account)
 
-    def __init__(self):
-        self.engine_temp = None
-        self.out_temp = None
-        self.voltage = None
-        self.engine_temp_before = None
-        self.voltage_before = None
-        self.count = None
-        self.engine_on = None
+    async def start_engine(self) -> Optional[TrackedCommand]:
+        return await self._deliver(4)
 
+    async def stop_engine(self) -> Optional[TrackedCommand]:
+        return await self._deliver(8)
 
-class Pandora(PandoraBase):
-    def __init__(self):
-        super().__init__()
-        self.state = PandoraState()
+    async def start_heater(self) -> Optional[TrackedCommand]:
+        return await self._deliver(21)
 
-    async def start_engine(self):
+    async def _deliver(self, command: int) -> Optional[TrackedCommand]:
+        """Команда без повторного срабатывания при сбоях связи."""
         if await self._check_auth():
-            await self._send_command(4)
+            return await self.submit(command)
+        return None
 
-    async def stop_engine(self):
-        if await self._check_auth():
-            await self._send_command(8)
+    def submit(
+        self, command: int, priority: Optional[int] = None, ttl: Optional[float] = None
+    ) -> asyncio.Future:
+        """Ставит команду в очередь устройства, не дожидаясь доставки.
 
-    async def start_heater(self):
-        if await self._check_auth():
-            await self._send_command(21)
+        Пока устройство вне зоны GSM, команда ждёт в очереди до ttl секунд.
+        """
+        return self.poller.queue(self._device_id).submit(command, priority, ttl)
 
     async def check(self):
         if await self._check_auth():
-            await self._send_command(255)
-            await asyncio.sleep(3)
-            data = await self._get_updates()
+            # Запрос статуса (255) и ожидание ответа устройства
+            data = await self.submit(STATUS_COMMAND)
             await self._set_params(data)
 
+    async def refresh(self, max_age: float = 0):
+        """Обновляет состояние по /updates без команды устройству.
+
+        Данные не старше max_age секунд берутся из общего опроса без запроса.
+        """
+        data = await self.poller.fetch(max_age)
+        await self._set_params(data)
+
     async def _set_params(self, data: dict):
         if not self._device_id:
             logger.warning("Device ID не установлен, невозможно обновить параметры")
@@ -51,11 +67,11 @@ class Pandora(PandoraBase):
         stats = data.get("stats", {})
         device_stats = stats.get(str(self._device_id), {})
 
+        self.state.device_id = self._device_id
+        self.state.name = self._device_name()
+
         # Берём нужные параметры
-        self.state.engine_temp = device_stats.get("engine_temp")
-        self.state.out_temp = device_stats.get("out_temp")
-        self.state.voltage = device_stats.get("voltage")
-        self.state.engine_on = device_stats.get("engine_rpm") > 100
+        self.state.update(device_stats)
 
         logger.debug(
             "Обновлены параметры: engine_temp=%s, out_temp=%s, voltage=%s",
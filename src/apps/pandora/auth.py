@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Tuple
+
+from apps.pandora.session import session_store
+
+logger = logging.getLogger(__name__)
+
+# Корутина логина: возвращает cookies и список устройств аккаунта
+Authenticator = Callable[[], Awaitable[Tuple[Dict[str, str], List[Dict[str, Any]]]]]
+
+
+class AuthManager:
+    """Общий контекст авторизации аккаунта Pandora.
+
+    Хранит cookies и список устройств, а повторный логин выполняет
+    не более одного раза одновременно: остальные вызовы ждут его результат.
+    """
+
+    _managers: Dict[str, "AuthManager"] = {}
+
+    def __init__(self, login: str):
+        self.login = login
+        saved = session_store.get(login)
+        self.cookies: Dict[str, str] = dict(saved.get("cookies") or {})
+        self.devices: List[Dict[str, Any]] = list(saved.get("devices") or [])
+        self.device_id: Optional[int] = saved.get("device_id")
+        self.generation = 0  # номер логина, увеличивается при каждой новой сессии
+        self.alive_at: float = 0.0  # время последнего подтверждения сессии
+        self._inflight: Optional[asyncio.Future] = None
+        if self.cookies:
+            logger.debug("Сессия %s восстановлена из кэша", login)
+
+    @classmethod
+    def for_account(cls, login: str) -> "AuthManager":
+        """Возвращает общий AuthManager для аккаунта."""
+        manager = cls._managers.get(login)
+        if manager is None:
+            manager = cls._managers[login] = cls(login)
+        return manager
+
+    def touch(self):
+        """Отмечает, что сессия только что подтверждена сервером."""
+        self.alive_at = time.monotonic()
+
+    def is_fresh(self, ttl: float) -> bool:
+        return bool(self.alive_at) and time.monotonic() - self.alive_at < ttl
+
+    def invalidate(self, generation: int):
+        """Сбрасывает сессию, если она всё ещё та, с которой пришла ошибка."""
+        if generation != self.generation or not self.cookies:
+            return
+        self.cookies = {}
+        self.alive_at = 0.0
+        session_store.invalidate(self.login)
+        logger.debug("Сессия %s сброшена", self.login)
+
+    async def relogin(
+        self, authenticate: Authenticator, generation: Optional[int] = None
+    ) -> Dict[str, str]:
+        """Выполняет логин или присоединяется к уже идущему.
+
+        Если передан generation и с тех пор сессия уже обновлена другим
+        вызовом, возвращает новые cookies без обращения к серверу.
+        """
+        if generation is not None and generation != self.generation and self.cookies:
+            return self.cookies
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._run(authenticate))
+        else:
+            logger.debug("Логин %s уже выполняется — ожидаем его", self.login)
+        return await asyncio.shield(self._inflight)
+
+    async def _run(self, authenticate: Authenticator) -> Dict[str, str]:
+        try:
+            cookies, devices = await authenticate()
+        finally:
+            self._inflight = None
+
+        self.cookies = cookies
+        self.devices = devices
+        if devices and self.device_id not in {d.get("id") for d in devices}:
+            self.device_id = devices[0].get("id")
+        self.generation += 1
+        self.touch()
+        session_store.update(
+            self.login,
+            cookies=dict(cookies),
+            devices=devices,
+            device_id=self.device_id,
+        )
+        logger.debug(
+            "Логин %s выполнен, устройств: %d, device_id=%s",
+            self.login,
+            len(devices),
+            self.device_id,
+        )
+        return cookies
@@ -1,12 +1,30 @@
 import asyncio
 import logging
 import aiohttp
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+from apps.pandora.auth import AuthManager
+from apps.pandora.http import get_session
+from apps.pandora.retry import (
+    RetryState,
+    DeliveryUnknown,
+    DeviceUnreachable,
+    breaker,
+    SESSION,
+    GSM,
+    SERVER,
+    CLIENT,
+    CONNECTION,
+)
+from apps.pandora.updates import UpdatesCursor
 from core import settings
+from core.config import Account
 
 logger = logging.getLogger(__name__)
 
 
+SESSION_ERRORS = {"sid-expired", "invalid session id"}
+
+
 class PandoraBase:
     __BASE_URL = "https://p-on.ru/api"
 
@@ -30,28 +48,79 @@ class PandoraBase:
         "Connection": "keep-alive",
     }
 
-    def __init__(self):
-        self._session: Optional[aiohttp.ClientSession] = None
-        self._cookies: Dict[str, str] = {}
-        self._login_name = settings.pandora.login
-        self._password = settings.pandora.password
-        self._device_id: Optional[int] = None  # ID устройства для команд
+    def __init__(
+        self,
+        device_id: Optional[int] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+        account: Optional[Account] = None,
+    ):
+        # Сессия берётся взаймы (общая для процесса) и экземпляром не закрывается
+        self._session: Optional[aiohttp.ClientSession] = session
+        self._account = account or settings.get_account()
+        self._login_name = self._account.login
+        self._password = self._account.password
+        # Общий для всех экземпляров аккаунта контекст авторизации
+        self._auth = AuthManager.for_account(self._login_name)
+        # ID устройства для команд, по умолчанию — первое авто аккаунта
+        self._device_id: Optional[int] = device_id or self._auth.device_id
         self._auth_ok = False
+        self._optimistic_auth = settings.pandora.optimistic_auth
+        self._alive_ttl = settings.pandora.alive_ttl
 
     async def __aenter__(self):
-        self._session = aiohttp.ClientSession()
+        await self._ensure_session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self._session:
-            await self._session.close()
+        pass
 
     async def _ensure_session(self):
         if not self._session or self._session.closed:
-            self._session = aiohttp.ClientSession()
+            self._session = get_session()
+
+    @property
+    def device_id(self) -> Optional[int]:
+        return self._device_id
+
+    @property
+    def account(self) -> Account:
+        return self._account
+
+    def _device_name(self, device_id: Optional[int] = None) -> Optional[str]:
+        """Название авто; None, если на аккаунте одно устройство."""
+        device_id = device_id or self._device_id
+        if len(self._auth.devices) < 2:
+            return None
+        for device in self._auth.devices:
+            if device.get("id") == device_id:
+                return device.get("name") or str(device_id)
+        return str(device_id)
+
+    async def devices(self) -> List[Dict[str, Any]]:
+        """Список устройств аккаунта (из кэша или после логина)."""
+        if not self._auth.devices:
+            await self._login()
+        return list(self._auth.devices)
+
+    @property
+    def _cookies(self) -> Dict[str, str]:
+        return self._auth.cookies
 
-    async def _login(self) -> Dict[str, Any]:
-        """Авторизация в Pandora API и сохранение cookies sid/lang."""
+    async def _login(self, generation: Optional[int] = None) -> Dict[str, str]:
+        """Авторизация через общий AuthManager.
+
+        Параллельные вызовы ждут один логин; если сессия generation уже
+        обновлена другим вызовом, новые cookies возвращаются сразу.
+        """
+        cookies = await self._auth.relogin(self._authenticate, generation)
+        if not self._device_id:
+            self._device_id = self._auth.device_id
+        self._auth_ok = True
+        return cookies
+
+    async def _authenticate(self) -> Tuple[Dict[str, str], List[Dict[str, Any]]]:
+        """Логин в Pandora API: возвращает cookies sid/lang и список устройств."""
+        breaker.check()
         await self._ensure_session()
         url = f"{self.__BASE_URL}/users/login"
         data = {
@@ -85,17 +154,30 @@ class PandoraBase:
             session_id = result.get("session_id")
             lang_value = result.get("lang", "ru")
 
-            if session_id:
-                self._cookies["sid"] = session_id
-                self._cookies["lang"] = lang_value
-                logger.debug(
-                    "Авторизация успешна: sid=%s, lang=%s", session_id, lang_value
-                )
-                await self._fetch_devices()
-            else:
+            if not session_id:
                 logger.warning("Ответ без session_id: %s", result)
+                raise aiohttp.ClientResponseError(
+                    status=resp.status,
+                    request_info=resp.request_info,
+                    history=resp.history,
+                    message=str(result),
+                )
 
-            return result
+        cookies = {"sid": session_id, "lang": lang_value}
+        logger.debug("Авторизация успешна: sid=%s, lang=%s", session_id, lang_value)
+
+        # Список устройств запрашивается один раз на логин
+        async with self._session.get(
+            f"{self.__BASE_URL}/devices",
+            cookies=cookies,
+            headers=self.__BASE_HEADERS,
+        ) as resp:
+            resp.raise_for_status()
+            devices = await resp.json()
+        if not devices or not isinstance(devices, list):
+            logger.warning("Список устройств пуст или некорректный: %s", devices)
+            devices = []
+        return cookies, devices
 
     async def _fetch_devices(self) -> None:
         """Получает список устройств и сохраняет device_id первого авто."""
@@ -103,24 +185,44 @@ class PandoraBase:
         if not devices or not isinstance(devices, list):
             logger.warning("Список устройств пуст или некорректный: %s", devices)
             return
-        self._device_id = devices[0].get("id")
+        self._auth.devices = devices
+        if self._auth.device_id not in {d.get("id") for d in devices}:
+            self._auth.device_id = devices[0].get("id")
+        if not self._device_id:
+            self._device_id = self._auth.device_id
         logger.debug("Сохранён device_id: %s", self._device_id)
         self._auth_ok = True
 
-    async def _send_command(self, command: int) -> Dict[str, Any]:
-        """Отправка команды устройству по device_id."""
-        if not self._device_id:
+    async def _send_command(
+        self,
+        command: int,
+        device_id: Optional[int] = None,
+        idempotent: bool = False,
+    ) -> Dict[str, Any]:
+        """Отправка команды устройству по device_id.
+
+        Неидемпотентная команда повторяется только при гарантированной
+        недоставке; если она могла дойти, бросается DeliveryUnknown.
+        """
+        device_id = device_id or self._device_id
+        if not device_id:
             raise ValueError(
                 "Device ID не установлен. Выполните fetch_devices() или login() сначала."
             )
-        data = {"command": command, "id": self._device_id}
-        result = await self._request("POST", "/devices/command", data=data)
+        data = {"command": command, "id": device_id}
+        result = await self._request(
+            "POST", "/devices/command", data=data, idempotent=idempotent
+        )
         logger.debug("Команда %s отправлена: %s", command, result)
         return result
 
     async def _is_alive(self) -> bool:
         """Проверяет, активна ли текущая сессия (POST /api/iamalive)."""
+        if self._auth.is_fresh(self._alive_ttl):
+            logger.debug("Сессия подтверждена недавно, iamalive пропущен.")
+            return True
         await self._ensure_session()
+        generation = self._auth.generation
         url = f"{self.__BASE_URL}/iamalive"
         data = {"num_click": 0}
         cookies = self._cookies or {}
@@ -142,9 +244,12 @@ class PandoraBase:
             status = result.get("status")
             if status == "you are alive":
                 logger.debug("Сессия активна.")
+                self._auth.touch()
                 return True
-            elif status == "sid-expired":
+            elif status in SESSION_ERRORS:
                 logger.warning("Сессия истекла, требуется повторный логин.")
+                self._auth.invalidate(generation)
+                self._auth_ok = False
                 return False
             else:
                 logger.warning("Неизвестный статус проверки: %s", status)
@@ -158,17 +263,33 @@ class PandoraBase:
         json_data: Optional[Dict[str, Any]] = None,
         data: Optional[Dict[str, Any]] = None,
         params: Optional[Dict[str, Any]] = None,
-        retries: int = 3,
+        deadline: Optional[float] = None,
+        idempotent: bool = True,
     ) -> Dict[str, Any]:
-        """Запрос к Pandora API с авторизацией и повтором при временных ошибках."""
+        """Запрос к Pandora API с авторизацией и повтором при временных ошибках.
+
+        Паузы и число повторов задаются политиками settings.retry по классу
+        ошибки и запросу; deadline ограничивает общее время со всеми повторами.
+        Неидемпотентный запрос не повторяется после ошибок, при которых
+        сервер мог его выполнить (5xx, обрыв после отправки): вместо
+        повтора бросается DeliveryUnknown.
+        """
         await self._ensure_session()
+        state = RetryState(path, deadline)
 
-        for attempt in range(1, retries + 2):  # 1 основная + N повторов
-            # Проверяем валидность сессии
-            if not self._cookies or not await self._is_alive():
+        while True:
+            # При недоступном API запрос не отправляется вовсе
+            breaker.check()
+
+            # Проверяем валидность сессии. В оптимистичном режиме запрос
+            # уходит сразу с сохранёнными cookies, без iamalive.
+            if not self._cookies or (
+                not self._optimistic_auth and not await self._is_alive()
+            ):
                 logger.debug("Сессия недействительна — логинимся заново")
-                await self._login_name()
+                await self._login()
 
+            generation = self._auth.generation
             url = f"{self.__BASE_URL.rstrip('/')}/{path.lstrip('/')}"
 
             try:
@@ -181,90 +302,132 @@ class PandoraBase:
                     cookies=self._cookies,
                     headers=self.__BASE_HEADERS,
                 ) as resp:
+                    if resp.status >= 500:
+                        breaker.failure()
+                    else:
+                        breaker.success()
+
                     text = await resp.text()
                     try:
                         result = await resp.json()
                     except Exception:
                         logger.error("Ответ не JSON (%s): %s", resp.status, text)
-                        raise
+                        if resp.status < 500:
+                            raise
+                        # Страница ошибки прокси — повторяем как ошибку сервера
+                        result = {"status": "fail", "error_text": text[:200]}
+
+                    status = result.get("status") if isinstance(result, dict) else None
 
                     # --- Обработка ошибок ---
-                    if resp.status >= 400 or (
-                        isinstance(result, dict) and result.get("status") == "fail"
+                    if (
+                        resp.status >= 400
+                        or status == "fail"
+                        or status in SESSION_ERRORS
                     ):
+                        kind = self._error_kind(resp.status, result)
                         logger.warning(
-                            "Ошибка запроса (%s %s): %s — попытка %d/%d",
+                            "Ошибка запроса (%s %s): %s — повтор %d",
                             method,
                             url,
                             result,
-                            attempt,
-                            retries + 1,
-                        )
-
-                        # 1️⃣ Ошибка сессии
-                        if isinstance(result, dict) and result.get("status") in {
-                            "sid-expired",
-                            "invalid session id",
-                        }:
-                            await self._login_name()
-                            if attempt <= retries:
-                                await asyncio.sleep(1)
-                                continue
-
-                        # 2️⃣ Ошибка GSM (временная) — повтор через 5 сек
-                        if (
-                            isinstance(result, dict)
-                            and result.get("error_text") == "GSM is unreachable"
-                        ):
-                            if attempt <= retries:
-                                logger.info("GSM недоступен — повтор через 5 секунд...")
-                                await asyncio.sleep(5)
-                                continue
-
-                        # 3️⃣ Серверная ошибка (5xx) — повтор через 2 сек
-                        if 500 <= resp.status < 600 and attempt <= retries:
-                            await asyncio.sleep(2)
-                            continue
-
-                        # 4️⃣ Ошибка клиента (400) — повтор через 5 сек
-                        if resp.status == 400 and attempt <= retries:
-                            logger.info("Ошибка 400 — пробуем снова через 5 секунд...")
-                            await asyncio.sleep(5)
-                            continue
-
-                        # Если все попытки исчерпаны
-                        raise aiohttp.ClientResponseError(
-                            request_info=resp.request_info,
-                            history=resp.history,
-                            status=resp.status,
-                            message=str(result),
+                            state.total,
                         )
 
+                        # Ошибка сессии — логинимся (или ждём чужой логин)
+                        if kind == SESSION:
+                            self._auth.invalidate(generation)
+                            self._auth_ok = False
+
+                        if kind == SERVER and not idempotent:
+                            raise DeliveryUnknown(
+                                f"{method} {path}: ответ {resp.status} {result}"
+                            )
+                        delay = state.next_delay(kind) if kind else None
+                        if delay is None:
+                            error = (
+                                DeviceUnreachable
+                                if kind == GSM
+                                else aiohttp.ClientResponseError
+                            )
+                            raise error(
+                                request_info=resp.request_info,
+                                history=resp.history,
+                                status=resp.status,
+                                message=str(result),
+                            )
+                        if kind == SESSION:
+                            await self._login(generation)
+                        logger.info("Повтор (%s) через %.1f сек", kind, delay)
+                        await asyncio.sleep(delay)
+                        continue
+
+                    self._auth.touch()
                     return result  # успешный ответ
 
-            except aiohttp.ClientError as e:
-                logger.warning(
-                    "Ошибка соединения: %s (попытка %d/%d)", e, attempt, retries + 1
-                )
-                if attempt <= retries:
-                    await asyncio.sleep(2)
-                    continue
-                raise
-
-        raise RuntimeError("Не удалось выполнить запрос после всех попыток")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                breaker.failure()
+                # Соединение не установлено — запрос точно не отправлен
+                if not idempotent and not isinstance(e, aiohttp.ClientConnectorError):
+                    raise DeliveryUnknown(f"{method} {path}: {e!r}") from e
+                delay = state.next_delay(CONNECTION)
+                logger.warning("Ошибка соединения: %r (повтор %d)", e, state.total)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _error_kind(status: int, result: Any) -> Optional[str]:
+        """Класс ошибки ответа для выбора политики повторов."""
+        if isinstance(result, dict):
+            if result.get("status") in SESSION_ERRORS:
+                return SESSION
+            if result.get("error_text") == "GSM is unreachable":
+                return GSM
+        if 500 <= status < 600:
+            return SERVER
+        if status == 400:
+            return CLIENT
+        return None
 
     async def _check_auth(self):
-        self._auth_ok = await self._is_alive()
+        if self._optimistic_auth and self._cookies and self._device_id:
+            # Сессия будет проверена ответом на сам запрос
+            self._auth_ok = True
+            return self._auth_ok
+        self._auth_ok = bool(self._cookies) and await self._is_alive()
         if not self._auth_ok:
             await self._login()
+        elif not self._device_id:
+            await self._fetch_devices()
         return self._auth_ok
 
-    async def _get_updates(self) -> Dict[str, Any]:
+    async def _ws_connect(self, url: str) -> aiohttp.ClientWebSocketResponse:
+        """Открывает WebSocket push-канала с cookies текущей сессии."""
+        await self._ensure_session()
+        if not self._cookies:
+            await self._login()
+        headers = {
+            key: value
+            for key, value in self.__BASE_HEADERS.items()
+            if key in {"User-Agent", "Origin", "Referer"}
+        }
+        headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self._cookies.items())
+        return await self._session.ws_connect(url, headers=headers, heartbeat=30)
+
+    async def _get_updates(self, cursor: UpdatesCursor) -> Dict[str, Any]:
         """
         Получает обновления Pandora API.
-        Запрос: GET /updates?ts=-1
+        Запрос: GET /updates?ts=<ts последнего ответа>, первый и после
+        разрыва курсора — GET /updates?ts=-1 (полный снимок).
+        Курсор принадлежит опросу аккаунта (TelemetryPoller): один на аккаунт.
+        Возвращает накопленное состояние устройств.
         """
-        params = {"ts": "-1"}
+        params = cursor.params()
+        full = params["ts"] == "-1"
         result = await self._request("GET", "/updates", params=params)
-        logger.debug("Получены обновления: %s", result)
-        return result
+        logger.debug("Получены обновления (ts=%s): %s", params["ts"], result)
+        if not cursor.apply(result, full) and not full:
+            result = await self._request("GET", "/updates", params={"ts": "-1"})
+            cursor.apply(result, full=True)
+        return cursor.snapshot()
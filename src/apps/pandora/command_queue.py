@@ -0,0 +1,195 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import time
+from typing import Optional, Dict, Any, List, TYPE_CHECKING
+
+import aiohttp
+
+from apps.pandora.retry import DeviceUnreachable
+from apps.utils.wait import wait_until
+from core import settings
+
+if TYPE_CHECKING:
+    from apps.pandora.poller import TelemetryPoller
+
+logger = logging.getLogger(__name__)
+
+STATUS_COMMAND = 255
+
+# Меньше — раньше: остановка двигателя важнее запуска, запрос статуса — последним
+PRIORITIES: Dict[int, int] = {8: 0, 4: 1, 21: 1, STATUS_COMMAND: 2}
+DEFAULT_PRIORITY = 1
+
+
+class CommandExpired(asyncio.TimeoutError):
+    """Команда не доставлена до истечения срока жизни в очереди."""
+
+
+class QueuedCommand:
+    def __init__(self, command: int, priority: int, expires_at: float, seq: int):
+        self.command = command
+        self.priority = priority
+        self.expires_at = expires_at
+        self.seq = seq
+        self.waiters: List[asyncio.Future] = []
+
+    def __lt__(self, other: "QueuedCommand") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    @property
+    def wanted(self) -> bool:
+        """Есть вызывающие, которые ещё ждут результата."""
+        return any(not f.done() for f in self.waiters)
+
+    def resolve(self, result: Any = None, error: Optional[BaseException] = None):
+        for future in self.waiters:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+class CommandQueue:
+    """Очередь команд одного устройства.
+
+    Команды выполняются по приоритету, повторная команда с тем же кодом
+    присоединяется к уже стоящей в очереди. Пока устройство вне зоны GSM,
+    команды ждут его выхода на связь, но не дольше своего срока жизни.
+    """
+
+    def __init__(self, poller: "TelemetryPoller", device_id: int):
+        self._poller = poller
+        self.device_id = device_id
+        self._heap: List[QueuedCommand] = []
+        self._queued: Dict[int, QueuedCommand] = {}
+        self._seq = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self.unreachable = False
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def submit(
+        self,
+        command: int,
+        priority: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ) -> asyncio.Future:
+        """Ставит команду в очередь и сразу возвращает future с результатом."""
+        if ttl is None:
+            ttl = (
+                settings.commands.status_ttl
+                if command == STATUS_COMMAND
+                else settings.commands.queue_ttl
+            )
+        expires_at = time.monotonic() + ttl
+        future = asyncio.get_running_loop().create_future()
+
+        item = self._queued.get(command)
+        if item is not None:
+            logger.debug("Команда %s → %s уже в очереди", command, self.device_id)
+            item.expires_at = max(item.expires_at, expires_at)
+        else:
+            if priority is None:
+                priority = PRIORITIES.get(command, DEFAULT_PRIORITY)
+            item = QueuedCommand(command, priority, expires_at, next(self._seq))
+            self._queued[command] = item
+            heapq.heappush(self._heap, item)
+        item.waiters.append(future)
+        self._ensure_running()
+        return future
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    def _expire(self):
+        """Снимает с очереди просроченные и никому не нужные команды."""
+        now = time.monotonic()
+        alive = []
+        for item in self._heap:
+            if item.expires_at <= now:
+                logger.warning(
+                    "Команда %s → %s снята: устройство не на связи",
+                    item.command,
+                    self.device_id,
+                )
+                item.resolve(error=CommandExpired(f"Команда {item.command} истекла"))
+            if item.wanted:
+                alive.append(item)
+            else:
+                self._queued.pop(item.command, None)
+        heapq.heapify(alive)
+        self._heap = alive
+
+    async def _run(self):
+        while True:
+            self._expire()
+            if not self._heap:
+                break
+            item = heapq.heappop(self._heap)
+            try:
+                result = await self._execute(item.command)
+            except DeviceUnreachable:
+                heapq.heappush(self._heap, item)
+                await self._wait_reachable()
+                continue
+            except Exception as e:
+                self._queued.pop(item.command, None)
+                item.resolve(error=e)
+                continue
+            self.unreachable = False
+            self._queued.pop(item.command, None)
+            item.resolve(result)
+
+    async def _execute(self, command: int) -> Any:
+        if command == STATUS_COMMAND:
+            return await self._poller.wake(self.device_id)
+        return await self._poller.commands.deliver(command, self.device_id)
+
+    async def _wait_reachable(self):
+        """Ждёт выхода устройства на связь по телеметрии."""
+        if not self.unreachable:
+            logger.warning(
+                "Устройство %s не на связи — команды ждут в очереди (%d)",
+                self.device_id,
+                len(self._heap),
+            )
+        self.unreachable = True
+        reported = self._poller.device_report(self.device_id)
+        timeout = min(
+            settings.commands.unreachable_interval,
+            max(min(i.expires_at for i in self._heap) - time.monotonic(), 0),
+        )
+
+        async def probe():
+            try:
+                await self._poller.fetch()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug("Ошибка опроса при ожидании связи: %s", e)
+
+        # Ускоренный опрос /updates, пока в очереди есть команды
+        async with self._poller.active():
+            if await wait_until(
+                lambda: self._poller.device_report(self.device_id) != reported,
+                probe,
+                timeout=timeout,
+                interval=5,
+                max_interval=15,
+            ):
+                logger.info("Устройство %s снова на связи", self.device_id)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        for item in self._heap:
+            item.resolve(error=CommandExpired("Очередь команд остановлена"))
+        self._heap.clear()
+        self._queued.clear()
@@ -0,0 +1,132 @@
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Optional, Dict, Any, Callable, Deque, Tuple, TYPE_CHECKING
+
+from apps.pandora.retry import DeliveryUnknown
+from apps.pandora.state import PandoraState
+from apps.utils.telemetry import telemetry
+from apps.utils.wait import wait_until
+from core import settings
+
+if TYPE_CHECKING:
+    from apps.pandora.poller import TelemetryPoller
+
+logger = logging.getLogger(__name__)
+
+# Статусы доставки команды
+SENT = "sent"  # сервер принял команду
+CONFIRMED = "confirmed"  # выполнение видно по состоянию устройства
+NOT_LANDED = "not_landed"  # устройство сообщило, что команда не выполнена
+UNKNOWN = "unknown"  # доставку не удалось ни подтвердить, ни опровергнуть
+
+# Признак выполнения команды по состоянию устройства
+CONFIRMATIONS: Dict[int, Callable[[PandoraState], bool]] = {
+    4: lambda state: bool(state.engine_on),
+    8: lambda state: not state.engine_on,
+}
+
+
+class TrackedCommand:
+    """Команда устройству с клиентским ID и результатом доставки."""
+
+    def __init__(self, command: int, device_id: int):
+        self.id = uuid.uuid4().hex[:8]
+        self.command = command
+        self.device_id = device_id
+        self.created_at = time.time()
+        self.attempts = 0
+        self.status: Optional[str] = None
+
+    def __repr__(self):
+        return (
+            f"<Command {self.command} [{self.id}] dev={self.device_id} "
+            f"status={self.status} attempts={self.attempts}>"
+        )
+
+
+class CommandTracker:
+    """Доставка команд аккаунта без повторного срабатывания.
+
+    Команда отправляется повторно, только если её недоставка доказана:
+    запрос не ушёл на сервер или устройство прислало в push-канале
+    отказ выполнения. Если доставку проверить нельзя, команда получает
+    статус UNKNOWN и не повторяется.
+    """
+
+    def __init__(self, poller: "TelemetryPoller"):
+        self._poller = poller
+        self.history: Deque[TrackedCommand] = deque(maxlen=50)
+        # Результаты команд из push-канала: (device_id, command) -> (время, результат)
+        self._results: Dict[Tuple[int, int], Tuple[float, Dict[str, Any]]] = {}
+        poller.add_command_listener(self._on_result)
+
+    def _on_result(self, device_id: int, result: Dict[str, Any]):
+        command = result.get("command_id") or result.get("command")
+        if command is not None:
+            self._results[(device_id, int(command))] = (time.time(), result)
+
+    async def deliver(self, command: int, device_id: int) -> TrackedCommand:
+        """Отправляет команду и возвращает её с итоговым статусом."""
+        cmd = TrackedCommand(command, device_id)
+        self.history.append(cmd)
+        while True:
+            cmd.attempts += 1
+            logger.info("Команда %s [%s] → %s", command, cmd.id, device_id)
+            try:
+                await self._poller._api._send_command(command, device_id)
+                cmd.status = SENT
+                telemetry.set_command(device_id, command)
+                return cmd
+            except DeliveryUnknown as e:
+                logger.warning("Доставка команды [%s] не известна: %s", cmd.id, e)
+                cmd.status = await self._confirm(cmd)
+            if cmd.status != NOT_LANDED:
+                break
+            if cmd.attempts >= settings.commands.attempts:
+                logger.error("Команда [%s] не доставлена", cmd.id)
+                break
+            logger.info("Команда [%s] не дошла до устройства — повтор", cmd.id)
+        logger.info("Команда [%s]: %s", cmd.id, cmd.status)
+        if cmd.status == CONFIRMED:
+            telemetry.set_command(device_id, command)
+        return cmd
+
+    def _pushed(self, cmd: TrackedCommand) -> Optional[Dict[str, Any]]:
+        """Результат команды из push-канала, пришедший после её отправки."""
+        at, result = self._results.get((cmd.device_id, cmd.command), (0.0, None))
+        return result if at >= cmd.created_at else None
+
+    async def _confirm(self, cmd: TrackedCommand) -> str:
+        """Проверяет по телеметрии и push-каналу, выполнена ли команда.
+
+        Отсутствие результата в состоянии недоставку не доказывает: устройство
+        могло ответить на запрос статуса раньше, чем выполнило команду.
+        """
+        predicate = CONFIRMATIONS.get(cmd.command)
+
+        def executed() -> bool:
+            state = self._poller.latest(cmd.device_id)
+            return predicate is not None and state is not None and predicate(state)
+
+        if predicate is None and not self._poller.push_connected:
+            # Выполнение не видно по состоянию, а результата из push не будет
+            return UNKNOWN
+        await wait_until(
+            lambda: self._pushed(cmd) is not None or executed(),
+            lambda: self._poller.wake(cmd.device_id),
+            timeout=settings.commands.confirm_timeout,
+            interval=3,
+            max_interval=10,
+        )
+        if executed():
+            return CONFIRMED
+        result = self._pushed(cmd)
+        if result is None:
+            return UNKNOWN
+        if result.get("result", 0):
+            # Устройство явно сообщило об ошибке выполнения
+            logger.warning("Команда [%s] отклонена устройством: %s", cmd.id, result)
+            return NOT_LANDED
+        return CONFIRMED
@@ -0,0 +1,52 @@
+import logging
+import ssl
+from typing import Optional
+
+import aiohttp
+
+from core import settings
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def _connector() -> aiohttp.TCPConnector:
+    """Пул соединений с keep-alive, кэшем DNS и общим TLS-контекстом.
+
+    Один SSLContext на процесс: сертификаты загружаются один раз,
+    а соединения с p-on.ru переиспользуются между запросами.
+    """
+    config = settings.http
+    return aiohttp.TCPConnector(
+        limit=config.limit,
+        limit_per_host=config.limit_per_host,
+        keepalive_timeout=config.keepalive_timeout,
+        ttl_dns_cache=config.ttl_dns_cache,
+        ssl=ssl.create_default_context(),
+    )
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Общая HTTP-сессия процесса; экземпляры Pandora берут её взаймы.
+
+    Cookies передаются явно в каждом запросе, поэтому хранилище cookies
+    отключено: запросы разных аккаунтов не смешиваются.
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=_connector(),
+            cookie_jar=aiohttp.DummyCookieJar(),
+            timeout=aiohttp.ClientTimeout(total=settings.http.timeout),
+        )
+        logger.debug("Создан общий HTTP-клиент")
+    return _session
+
+
+async def close_session():
+    """Закрывает общую сессию и пул соединений при остановке приложения."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -0,0 +1,341 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections import defaultdict
+from typing import (
+    Optional,
+    Dict,
+    Any,
+    List,
+    Set,
+    Callable,
+    AsyncIterator,
+)
+
+from apps.pandora.base import PandoraBase
+from apps.pandora.command_queue import CommandQueue, STATUS_COMMAND
+from apps.pandora.commands import CommandTracker
+from apps.pandora.push import PushTransport
+from apps.pandora.state import PandoraState
+from apps.pandora.updates import UpdatesCursor
+from apps.utils.telemetry import telemetry
+from apps.utils.wait import wait_until
+from core import settings
+from core.config import Account
+
+logger = logging.getLogger(__name__)
+
+Listener = Callable[[PandoraState], Any]
+CommandListener = Callable[[int, Dict[str, Any]], Any]
+
+
+class TelemetryPoller:
+    """Общий опрос /updates аккаунта с раздачей состояния подписчикам.
+
+    Один ответ /updates содержит все авто аккаунта, поэтому опрос ведётся
+    на аккаунт, а подписчики получают состояние своего устройства.
+    Одновременные запросы объединяются в один, фоновый опрос ускоряется,
+    пока идёт холодный запуск (active()), и замедляется без него.
+    """
+
+    _pollers: Dict[str, "TelemetryPoller"] = {}
+
+    def __init__(self, account: Account):
+        self.account = account
+        self._api = PandoraBase(account=account)
+        # Курсор /updates аккаунта и накопленное состояние его устройств
+        self._updates = UpdatesCursor(settings.pandora.updates_full_every)
+        self.states: Dict[int, PandoraState] = {}
+        self.fetched_at: float = 0.0
+        self._fetching: Optional[asyncio.Future] = None
+        self._waking: Dict[int, asyncio.Future] = {}
+        self._woken_at: Dict[int, float] = {}
+        # Время фонового запроса статуса (unix, сек) по устройствам
+        self._status_requested: Dict[int, int] = {}
+        self._subscribers: Dict[Optional[int], Set[asyncio.Queue]] = defaultdict(set)
+        self._listeners: Dict[Optional[int], List[Listener]] = defaultdict(list)
+        self._command_listeners: List[CommandListener] = []
+        self.push: Optional[PushTransport] = None
+        # Доставка команд с подтверждением по телеметрии
+        self.commands = CommandTracker(self)
+        self._queues: Dict[int, CommandQueue] = {}
+        self._active = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        if settings.telemetry.enabled:
+            # Все показания устройств аккаунта попадают в архив
+            self.add_listener(telemetry.record)
+
+    @classmethod
+    def for_account(cls, account: Account) -> "TelemetryPoller":
+        """Возвращает общий опрос для аккаунта."""
+        poller = cls._pollers.get(account.login)
+        if poller is None:
+            poller = cls._pollers[account.login] = cls(account)
+        return poller
+
+    @classmethod
+    async def close_all(cls):
+        """Останавливает все опросы при завершении приложения."""
+        for poller in list(cls._pollers.values()):
+            await poller.close()
+        cls._pollers.clear()
+
+    @property
+    def push_connected(self) -> bool:
+        return self.push is not None and self.push.connected
+
+    def start_push(self, url: Optional[str] = None):
+        """Включает получение телеметрии через WebSocket вместо опроса."""
+        if self.push is None:
+            self.push = PushTransport(self, url)
+        # Первый фоновый опрос откладываем на интервал: канал успеет подключиться
+        self.fetched_at = time.monotonic()
+        self.push.start()
+
+    def queue(self, device_id: int) -> CommandQueue:
+        """Очередь команд устройства."""
+        queue = self._queues.get(device_id)
+        if queue is None:
+            queue = self._queues[device_id] = CommandQueue(self, device_id)
+        return queue
+
+    @property
+    def interval(self) -> int:
+        if self._active:
+            return settings.poller.active_interval
+        return settings.poller.idle_interval
+
+    # ---------------------------
+    # Данные
+    # ---------------------------
+    def latest(self, device_id: int) -> Optional[PandoraState]:
+        """Последнее известное состояние устройства (без запроса)."""
+        return self.states.get(device_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Накопленный ответ /updates по всем авто аккаунта."""
+        return self._updates.snapshot()
+
+    def device_report(self, device_id: int) -> Dict[str, Any]:
+        """Отметки времени последнего выхода устройства на связь."""
+        return dict(self._updates.time.get(str(device_id), {}))
+
+    def device_seen_at(self, device_id: int) -> float:
+        """Последний выход устройства на связь по его отметкам (unix-время)."""
+        values = self.device_report(device_id).values()
+        return max((v for v in values if isinstance(v, (int, float))), default=0.0)
+
+    async def fetch(self, max_age: float = 0) -> Dict[str, Any]:
+        """Запрос /updates; параллельные вызовы ждут один запрос.
+
+        Если данные моложе max_age секунд, возвращает их без запроса.
+        """
+        if max_age and self.fetched_at:
+            # При открытом push-канале данные и так актуальны
+            if self.push_connected or time.monotonic() - self.fetched_at < max_age:
+                return self.snapshot()
+        if self._fetching is None:
+            self._fetching = asyncio.ensure_future(self._fetch())
+        return await asyncio.shield(self._fetching)
+
+    async def _fetch(self) -> Dict[str, Any]:
+        try:
+            data = await self._api._get_updates(self._updates)
+        finally:
+            self._fetching = None
+        self.fetched_at = time.monotonic()
+        self._publish(data)
+        return data
+
+    async def wake(self, device_id: int) -> Dict[str, Any]:
+        """Запрос статуса (255) и ожидание ответа устройства.
+
+        Повторные вызовы для того же авто присоединяются к идущему запросу,
+        а в течение poller.wake_dedup секунд после него — только читают /updates.
+        """
+        pending = self._waking.get(device_id)
+        if pending is None:
+            woken_at = self._woken_at.get(device_id, 0.0)
+            if time.monotonic() - woken_at < settings.poller.wake_dedup:
+                return await self.fetch()
+            pending = self._waking[device_id] = asyncio.ensure_future(
+                self._wake(device_id)
+            )
+        return await asyncio.shield(pending)
+
+    async def _wake(self, device_id: int) -> Dict[str, Any]:
+        try:
+            # Исходные отметки берём из свежего /updates, а не из старого снимка
+            await self.fetch()
+            reported = self.device_report(device_id)
+            sent_at = int(time.time())  # отметки устройства — целые секунды
+            await self._api._send_command(255, device_id, idempotent=True)
+            # Ждём ответа устройства на запрос статуса, но не дольше 3 секунд
+            await wait_until(
+                lambda: self.device_report(device_id) != reported
+                and self.device_seen_at(device_id) >= sent_at,
+                self.fetch,
+                timeout=3,
+                interval=1,
+                max_interval=1,
+            )
+            self._woken_at[device_id] = time.monotonic()
+        finally:
+            self._waking.pop(device_id, None)
+        return self.snapshot()
+
+    def request_status(self, device_id: int):
+        """Фоновый запрос статуса (255) через очередь команд, без ожидания.
+
+        Пока устройство молчит после прошлого запроса, новый не отправляется
+        (не чаще commands.queue_ttl).
+        """
+        requested_at = self._status_requested.get(device_id)
+        now = int(time.time())
+        if (
+            requested_at is not None
+            and self.device_seen_at(device_id) < requested_at
+            and now - requested_at < settings.commands.queue_ttl
+        ):
+            return
+        self._status_requested[device_id] = now
+
+        def done(future: asyncio.Future):
+            if not future.cancelled() and future.exception() is not None:
+                logger.info(
+                    "Запрос статуса %s не выполнен: %s", device_id, future.exception()
+                )
+
+        self.queue(device_id).submit(STATUS_COMMAND).add_done_callback(done)
+
+    # ---------------------------
+    # Подписки
+    # ---------------------------
+    async def subscribe(
+        self, device_id: Optional[int] = None
+    ) -> AsyncIterator[PandoraState]:
+        """Асинхронный итератор обновлений устройства (или всех авто).
+
+        Медленный подписчик получает только последнее состояние.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers[device_id].add(queue)
+        self._ensure_running()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[device_id].discard(queue)
+
+    def add_listener(
+        self, callback: Listener, device_id: Optional[int] = None
+    ) -> Callable[[], None]:
+        """Вызывает callback(state) при каждом обновлении; возвращает отписку."""
+        self._listeners[device_id].append(callback)
+        return lambda: self._listeners[device_id].remove(callback)
+
+    def add_command_listener(self, callback: CommandListener) -> Callable[[], None]:
+        """Вызывает callback(device_id, result) на результат команды из push-канала."""
+        self._command_listeners.append(callback)
+        return lambda: self._command_listeners.remove(callback)
+
+    def apply_push(self, device_id: int, stats: Dict[str, Any]):
+        """Применяет состояние устройства, пришедшее по push-каналу."""
+        updates = self._updates
+        merged = updates.stats.setdefault(str(device_id), {})
+        merged.update(stats)
+        # Отметка выхода на связь: по ней wake() видит ответ устройства
+        updates.time.setdefault(str(device_id), {})["push"] = time.time()
+        self.fetched_at = time.monotonic()
+        self._publish({"stats": {str(device_id): merged}})
+
+    def apply_command_result(self, device_id: int, result: Dict[str, Any]):
+        """Передаёт результат команды из push-канала подписчикам."""
+        logger.debug("Результат команды %s: %s", device_id, result)
+        for callback in list(self._command_listeners):
+            try:
+                callback(device_id, result)
+            except Exception:
+                logger.exception("Ошибка подписчика команд")
+
+    def _publish(self, data: Dict[str, Any]):
+        for key, device_stats in (data.get("stats") or {}).items():
+            device_id = int(key)
+            state = self.states.get(device_id)
+            if state is None:
+                state = self.states[device_id] = PandoraState()
+                state.device_id = device_id
+                state.chat_id = self.account.chat_id
+                state.name = self._api._device_name(device_id)
+            state.update(device_stats)
+
+            for target in (device_id, None):
+                for queue in self._subscribers.get(target, ()):
+                    if queue.full():
+                        queue.get_nowait()
+                    queue.put_nowait(state)
+                for callback in list(self._listeners.get(target, ())):
+                    try:
+                        result = callback(state)
+                        if asyncio.iscoroutine(result):
+                            asyncio.ensure_future(result)
+                    except Exception:
+                        logger.exception("Ошибка подписчика телеметрии")
+
+    # ---------------------------
+    # Фоновый опрос
+    # ---------------------------
+    @contextlib.asynccontextmanager
+    async def active(self):
+        """Ускоренный фоновый опрос на время холодного запуска."""
+        self._active += 1
+        self._wakeup.set()
+        self._ensure_running()
+        try:
+            yield self
+        finally:
+            self._active -= 1
+
+    def _has_consumers(self) -> bool:
+        return bool(self._active) or any(self._subscribers.values())
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while self._has_consumers():
+            self._wakeup.clear()
+            age = time.monotonic() - self.fetched_at
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=max(self.interval - age, 0)
+                )
+                continue  # режим изменился — пересчитываем интервал
+            except asyncio.TimeoutError:
+                pass
+            if not self._has_consumers():
+                break
+            if self.push_connected:
+                # Данные приходят по push-каналу — следующая проверка через интервал
+                self.fetched_at = time.monotonic()
+                continue
+            if time.monotonic() - self.fetched_at < self.interval:
+                continue  # данные уже обновил другой потребитель
+            try:
+                await self.fetch()
+            except Exception as e:
+                logger.warning("Ошибка фонового опроса %s: %s", self.account.name, e)
+                self.fetched_at = time.monotonic()  # повтор через интервал
+
+    async def close(self):
+        for queue in self._queues.values():
+            await queue.close()
+        if self.push is not None:
+            await self.push.stop()
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
@@ -0,0 +1,109 @@
+import asyncio
+import contextlib
+import logging
+from typing import Optional, Dict, Any, Iterator, Tuple, TYPE_CHECKING
+
+import aiohttp
+
+from core import settings
+
+if TYPE_CHECKING:
+    from apps.pandora.poller import TelemetryPoller
+
+logger = logging.getLogger(__name__)
+
+
+def _iter_devices(data: Dict[str, Any]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Пары (device_id, параметры) из данных события push-канала."""
+    if "dev_id" in data:
+        stats = {k: v for k, v in data.items() if k != "dev_id"}
+        yield int(data["dev_id"]), stats
+        return
+    for key, stats in data.items():
+        if str(key).isdigit() and isinstance(stats, dict):
+            yield int(key), stats
+
+
+class PushTransport:
+    """Телеметрия аккаунта через WebSocket p-on.ru.
+
+    Авторизуется той же cookie sid, что и HTTP API, передаёт состояние
+    устройств и результаты команд в TelemetryPoller. Пока канал открыт,
+    фоновый опрос /updates не выполняется.
+    """
+
+    def __init__(self, poller: "TelemetryPoller", url: Optional[str] = None):
+        self._poller = poller
+        self._url = url or settings.push.url
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self):
+        delay = 1
+        while True:
+            try:
+                await self._listen()
+                delay = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    "Push-канал %s недоступен: %s — переподключение через %s сек",
+                    self._poller.account.name,
+                    e,
+                    delay,
+                )
+            finally:
+                self.connected = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.push.reconnect_max)
+
+    async def _listen(self):
+        api = self._poller._api
+        generation = api._auth.generation
+        try:
+            ws = await api._ws_connect(self._url)
+        except aiohttp.WSServerHandshakeError as e:
+            if e.status in (401, 403):
+                # Сессия недействительна — логинимся и пробуем снова
+                api._auth.invalidate(generation)
+                await api._login(generation)
+            raise
+
+        async with ws:
+            self.connected = True
+            logger.info("Push-канал %s подключён", self._poller.account.name)
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    try:
+                        self._dispatch(msg.json())
+                    except Exception:
+                        logger.exception(
+                            "Ошибка обработки push-сообщения: %s", msg.data
+                        )
+                elif msg.type in (aiohttp.WSMsgType.ERROR, aiohttp.WSMsgType.CLOSE):
+                    break
+        logger.info("Push-канал %s закрыт", self._poller.account.name)
+
+    def _dispatch(self, message: Dict[str, Any]):
+        kind = message.get("type")
+        data = message.get("data") or {}
+        if kind in ("initial-state", "state"):
+            for device_id, stats in _iter_devices(data):
+                self._poller.apply_push(device_id, stats)
+        elif kind == "command":
+            for device_id, result in _iter_devices(data):
+                self._poller.apply_command_result(device_id, result)
+        else:
+            logger.debug("Push-сообщение %s пропущено", kind)
@@ -0,0 +1,133 @@
+import logging
+import random
+import time
+from typing import Optional, Dict
+
+import aiohttp
+
+from core import settings
+from core.config import RetryPolicy, Retry
+
+logger = logging.getLogger(__name__)
+
+# Классы ошибок Pandora API, для каждого — своя политика повторов
+SESSION = "session"
+GSM = "gsm"
+SERVER = "server"
+CLIENT = "client"
+CONNECTION = "connection"
+
+_DEFAULT_POLICIES = Retry().policies
+
+
+class PandoraUnavailable(aiohttp.ClientError):
+    """Pandora API недоступен: автомат открыт, запрос не отправлялся."""
+
+
+class DeliveryUnknown(aiohttp.ClientError):
+    """Запрос мог дойти до сервера, но ответ не получен или ошибочен."""
+
+
+class DeviceUnreachable(aiohttp.ClientResponseError):
+    """Устройство не на связи (GSM is unreachable) после всех повторов."""
+
+
+def policy_for(kind: str, path: str = "") -> RetryPolicy:
+    """Политика повторов для класса ошибки с учётом переопределений запроса."""
+    config = settings.retry
+    endpoint = config.endpoints.get("/" + path.lstrip("/"), {})
+    return (
+        endpoint.get(kind)
+        or config.policies.get(kind)
+        or _DEFAULT_POLICIES.get(kind)
+        or RetryPolicy()
+    )
+
+
+def backoff(policy: RetryPolicy, attempt: int) -> float:
+    """Пауза перед повтором attempt (с 1): экспонента с разбросом."""
+    delay = min(policy.delay * policy.factor ** (attempt - 1), policy.max_delay)
+    return delay * (1 - random.uniform(0, policy.jitter))
+
+
+class RetryState:
+    """Счётчики повторов одного запроса по классам ошибок и общий дедлайн."""
+
+    def __init__(self, path: str, deadline: Optional[float] = None):
+        self.path = path
+        self.deadline = time.monotonic() + (deadline or settings.retry.deadline)
+        self.attempts: Dict[str, int] = {}
+
+    def next_delay(self, kind: str) -> Optional[float]:
+        """Пауза перед повтором или None, если повторять больше нельзя."""
+        policy = policy_for(kind, self.path)
+        attempt = self.attempts.get(kind, 0) + 1
+        if attempt > policy.attempts:
+            return None
+        delay = backoff(policy, attempt)
+        if time.monotonic() + delay > self.deadline:
+            logger.debug("Повтор %s отменён: истекает дедлайн запроса", self.path)
+            return None
+        self.attempts[kind] = attempt
+        return delay
+
+    @property
+    def total(self) -> int:
+        return sum(self.attempts.values())
+
+
+class CircuitBreaker:
+    """Автомат отказов Pandora API.
+
+    После threshold подряд ошибок сервера или соединения запросы
+    не отправляются reset_timeout секунд. Затем пропускается один
+    пробный запрос: успех закрывает автомат, ошибка открывает снова.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def check(self):
+        """Пропускает запрос или сразу бросает PandoraUnavailable."""
+        if self.opened_at is None:
+            return
+        now = time.monotonic()
+        wait = self.reset_timeout - (now - self.opened_at)
+        if wait > 0:
+            raise PandoraUnavailable(
+                f"Pandora API недоступен, повтор через {wait:.0f} сек"
+            )
+        if self._trial_at is not None and now - self._trial_at < self.reset_timeout:
+            raise PandoraUnavailable("Pandora API недоступен, идёт пробный запрос")
+        self._trial_at = now
+
+    def success(self):
+        if self.opened_at is not None:
+            logger.info("Pandora API снова доступен")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None
+
+    def failure(self):
+        self.failures += 1
+        self._trial_at = None
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning(
+                    "Pandora API не отвечает (%d ошибок подряд) — пауза %s сек",
+                    self.failures,
+                    self.reset_timeout,
+                )
+            self.opened_at = time.monotonic()
+
+
+# Один автомат на процесс: API общий для всех аккаунтов
+breaker = CircuitBreaker(settings.retry.breaker_threshold, settings.retry.breaker_reset)
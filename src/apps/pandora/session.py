@@ -0,0 +1,65 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from core.config import SESSION_FILE
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """Хранилище сессий Pandora (cookies sid/lang и device_id) в памяти и на диске."""
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._data: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._data is not None:
+            return self._data
+        self._data = {}
+        if self._path.exists():
+            try:
+                with self._path.open("r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Не удалось прочитать файл сессии %s: %s", self._path, e)
+        return self._data
+
+    def _save(self):
+        self._path.parent.mkdir(exist_ok=True, parents=True)
+        tmp = self._path.with_suffix(".tmp")
+        try:
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self._path)
+        except OSError as e:
+            logger.warning("Не удалось сохранить файл сессии %s: %s", self._path, e)
+
+    def get(self, login: str) -> Dict[str, Any]:
+        """Возвращает сохранённую сессию аккаунта (пустой dict, если её нет)."""
+        return dict(self._load().get(login, {}))
+
+    def update(self, login: str, **fields):
+        """Обновляет поля сессии аккаунта и сохраняет на диск."""
+        data = self._load()
+        entry = data.setdefault(login, {})
+        if all(entry.get(k) == v for k, v in fields.items()):
+            return
+        entry.update(fields)
+        self._save()
+
+    def invalidate(self, login: str):
+        """Удаляет cookies аккаунта (device_id сохраняется)."""
+        data = self._load()
+        entry = data.get(login)
+        if not entry or "cookies" not in entry:
+            return
+        entry.pop("cookies")
+        self._save()
+        logger.debug("Сессия %s сброшена", login)
+
+
+session_store = SessionStore(SESSION_FILE)
@@ -0,0 +1,28 @@
+import time
+
+
+class PandoraState:
+    """Объект для хранения состояния Pandora."""
+
+    def __init__(self):
+        self.device_id = None
+        self.name = None  # название авто, если их на аккаунте несколько
+        self.chat_id = None  # чат уведомлений аккаунта
+        self.engine_temp = None
+        self.out_temp = None
+        self.voltage = None
+        self.engine_rpm = None
+        self.engine_temp_before = None
+        self.voltage_before = None
+        self.count = None
+        self.engine_on = None
+        self.updated_at = None  # время последнего обновления (unix)
+
+    def update(self, device_stats: dict):
+        """Обновляет параметры из stats устройства ответа /updates."""
+        self.engine_temp = device_stats.get("engine_temp")
+        self.out_temp = device_stats.get("out_temp")
+        self.voltage = device_stats.get("voltage")
+        self.engine_rpm = device_stats.get("engine_rpm")
+        self.engine_on = (self.engine_rpm or 0) > 100
+        self.updated_at = time.time()
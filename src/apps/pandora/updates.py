@@ -0,0 +1,58 @@
+import logging
+import time
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class UpdatesCursor:
+    """Курсор /updates: хранит ts сервера и накопленное состояние устройств.
+
+    Первый запрос (и запрос после сброса) идёт с ts=-1 и возвращает полный
+    снимок, последующие — только изменения с последнего ts, которые
+    сливаются в локальное состояние по каждому устройству.
+    """
+
+    def __init__(self, full_every: float):
+        self.ts: Optional[int] = None
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self.time: Dict[str, Dict[str, Any]] = {}
+        self._full_every = full_every  # максимальный возраст полного снимка, сек
+        self._full_at: float = 0.0
+
+    def params(self) -> Dict[str, str]:
+        """Параметры следующего запроса /updates."""
+        if self.ts is None or time.monotonic() - self._full_at >= self._full_every:
+            return {"ts": "-1"}
+        return {"ts": str(self.ts)}
+
+    def reset(self):
+        """Сбрасывает курсор: следующий запрос вернёт полный снимок."""
+        self.ts = None
+
+    def apply(self, result: Dict[str, Any], full: bool) -> bool:
+        """Применяет ответ /updates. Возвращает False при разрыве курсора."""
+        new_ts = result.get("ts") if isinstance(result, dict) else None
+        if new_ts is None or (self.ts is not None and new_ts < self.ts):
+            logger.debug("Разрыв курсора /updates (ts %s -> %s)", self.ts, new_ts)
+            self.reset()
+            return False
+
+        if full:
+            self.stats = {}
+            self.time = {}
+            self._full_at = time.monotonic()
+        for device_id, values in (result.get("stats") or {}).items():
+            self.stats.setdefault(str(device_id), {}).update(values or {})
+        for device_id, values in (result.get("time") or {}).items():
+            self.time.setdefault(str(device_id), {}).update(values or {})
+        self.ts = new_ts
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Накопленное состояние в формате ответа /updates?ts=-1."""
+        return {
+            "ts": self.ts,
+            "stats": {k: dict(v) for k, v in self.stats.items()},
+            "time": {k: dict(v) for k, v in self.time.items()},
+        }
@@ -0,0 +1,272 @@
+import argparse
+import bisect
+import logging
+import math
+import statistics
+import time
+from typing import Optional, Dict, Any, List, Iterable, Sequence
+
+from apps.utils.heater import HeaterDetector
+from apps.utils.telemetry import telemetry
+from apps.utils.warmup import COLD_OUT_TEMP, COLD_ENGINE_TEMP
+
+logger = logging.getLogger(__name__)
+
+# Границы диапазонов уличной температуры для времени прогрева, °C
+TEMP_BANDS = (-30, -20, -10, 0, COLD_OUT_TEMP)
+READY_TEMP = 20  # безопасная температура запуска двигателя
+MAX_CYCLES = 15  # циклов ожидания прогрева до отказа
+
+
+# ---------------------------
+# Вычисления по колонкам: None — NaN, маски — списки флагов
+# ---------------------------
+def _floats(values: Iterable) -> List[float]:
+    return [math.nan if v is None else float(v) for v in values]
+
+
+def _mask(values: Sequence[float], predicate) -> List[bool]:
+    return [not math.isnan(v) and bool(predicate(v)) for v in values]
+
+
+def _and(*masks: Sequence[bool]) -> List[bool]:
+    return [all(flags) for flags in zip(*masks)]
+
+
+def _select(values: Sequence[float], mask: Sequence[bool]) -> List[float]:
+    return [v for v, m in zip(values, mask) if m]
+
+
+def _valid(values: Sequence[float]) -> List[float]:
+    return [v for v in values if not math.isnan(v)]
+
+
+def _count(mask: Sequence[bool]) -> int:
+    return sum(mask)
+
+
+def _share(mask: Sequence[bool], total: int) -> Optional[float]:
+    return _count(mask) / total if total else None
+
+
+def _percentiles(values: Sequence[float], qs: Sequence[float]) -> List[float]:
+    values = sorted(_valid(values))
+    if not values:
+        return []
+    # Линейная интерполяция между соседними значениями
+    result = []
+    for q in qs:
+        pos = (len(values) - 1) * q / 100
+        lo, hi = math.floor(pos), math.ceil(pos)
+        result.append(values[lo] + (values[hi] - values[lo]) * (pos - lo))
+    return result
+
+
+def _slope(x: Sequence[float], y: Sequence[float]) -> Optional[float]:
+    """Наклон линейной зависимости y от x (МНК)."""
+    both = _and(_mask(x, lambda v: v == v), _mask(y, lambda v: v == v))
+    x, y = _select(x, both), _select(y, both)
+    if len(x) < 2 or min(x) == max(x):
+        return None
+    return statistics.linear_regression(x, y).slope
+
+
+def _bands(values: Sequence[float]) -> List[int]:
+    """Номер диапазона TEMP_BANDS для каждого значения."""
+    return [bisect.bisect_left(TEMP_BANDS, v) for v in values]
+
+
+def _band_label(i: int) -> str:
+    if i == 0:
+        return f"≤ {TEMP_BANDS[0]}°C"
+    if i == len(TEMP_BANDS):
+        return f"> {TEMP_BANDS[-1]}°C"
+    return f"{TEMP_BANDS[i - 1]}…{TEMP_BANDS[i]}°C"
+
+
+# ---------------------------
+# Отчёт
+# ---------------------------
+def build_report(
+    start: float = 0,
+    end: Optional[float] = None,
+    device_ids: Optional[Iterable[int]] = None,
+) -> Dict[str, Any]:
+    """Статистика холодных запусков за период (по всем или указанным авто)."""
+    columns = telemetry.cold_starts(start, end)
+    if device_ids is not None:
+        allowed = set(device_ids)
+        keep = [i for i, d in enumerate(columns["device_id"]) if d in allowed]
+        columns = {name: [values[i] for i in keep] for name, values in columns.items()}
+
+    total = len(columns["device_id"])
+    out_temp = _floats(columns["out_temp"])
+    engine_before = _floats(columns["engine_temp_before"])
+    minutes = _floats(columns["warmup_minutes"])
+    heater = _floats(columns["heater_on"])
+    drop = _floats(columns["heater_drop"])
+    cycles = _floats(columns["cycles"])
+    timeout = _floats(columns["warmup_timeout"])
+    engine_after = _floats(columns["engine_temp_after"])
+
+    cold = _and(
+        _mask(out_temp, lambda v: v <= COLD_OUT_TEMP),
+        _mask(engine_before, lambda v: v < COLD_ENGINE_TEMP),
+    )
+    warmed = _mask(minutes, lambda v: v >= 0)
+
+    # Время прогрева по диапазонам уличной температуры
+    bands = _bands(out_temp)
+    known = _mask(out_temp, lambda v: v == v)
+    by_temp = []
+    for i in range(len(TEMP_BANDS) + 1):
+        in_band = _and(warmed, known, _mask(bands, lambda b, i=i: b == i))
+        values = _select(minutes, in_band)
+        if values:
+            p50, p90 = _percentiles(values, (50, 90))
+            by_temp.append(
+                {"band": _band_label(i), "runs": len(values), "p50": p50, "p90": p90}
+            )
+
+    checked = _mask(heater, lambda v: v >= 0)
+    waited = _mask(cycles, lambda v: v >= 0)
+    threshold = HeaterDetector().threshold
+    drops = _valid(drop)
+
+    # Запуски у порогов условия: прогрев при почти тёплой погоде или двигателе
+    near_out = _and(cold, warmed, _mask(out_temp, lambda v: v > 0))
+    near_engine = _and(cold, warmed, _mask(engine_before, lambda v: v >= READY_TEMP))
+
+    return {
+        "runs": total,
+        "devices": len(set(columns["device_id"])),
+        "results": {
+            result: columns["result"].count(result)
+            for result in sorted(set(columns["result"]))
+        },
+        "cold_share": _share(cold, total),
+        "warmup": {
+            "runs": _count(warmed),
+            "p50": (_percentiles(_select(minutes, warmed), (50,)) or [None])[0],
+            "by_temp": by_temp,
+            "slope": _slope(_select(out_temp, warmed), _select(minutes, warmed)),
+        },
+        "heater": {
+            "checked": _count(checked),
+            "success_rate": _share(
+                _and(checked, _mask(heater, lambda v: v > 0)), _count(checked)
+            ),
+        },
+        "voltage_sag": {
+            "runs": len(drops),
+            "percentiles": _percentiles(drops, (10, 50, 90)),
+            "below_threshold": _share(
+                _mask(drops, lambda v: v < threshold), len(drops)
+            ),
+            "threshold": threshold,
+        },
+        "timeouts": {
+            "runs": _count(waited),
+            "rate": _share(
+                _and(waited, _mask(timeout, lambda v: v > 0)), _count(waited)
+            ),
+        },
+        "thresholds": {
+            "near_out_temp": _count(near_out),
+            "near_out_temp_p50": (
+                _percentiles(_select(minutes, near_out), (50,)) or [None]
+            )[0],
+            "near_engine_temp": _count(near_engine),
+            "engine_at_start_p50": (
+                _percentiles(_select(engine_after, warmed), (50,)) or [None]
+            )[0],
+        },
+    }
+
+
+def _pct(value: Optional[float]) -> str:
+    return "—" if value is None else f"{value * 100:.0f}%"
+
+
+def _min(value: Optional[float]) -> str:
+    return "—" if value is None else f"{value:.0f} мин"
+
+
+def format_report(report: Dict[str, Any], days: Optional[int] = None) -> str:
+    """Отчёт текстом для бота и консоли."""
+    period = f" за {days} дн." if days else ""
+    if not report["runs"]:
+        return f"📈 Запусков{period} нет."
+    results = ", ".join(f"{k}: {v}" for k, v in report["results"].items())
+    warmup = report["warmup"]
+    sag = report["voltage_sag"]
+    lines = [
+        f"📈 Холодные запуски{period}: {report['runs']} "
+        f"(авто: {report['devices']}; {results})",
+        f"Условия прогрева (улица ≤ {COLD_OUT_TEMP}°C, двигатель "
+        f"< {COLD_ENGINE_TEMP}°C): {_pct(report['cold_share'])} запусков",
+        "",
+        f"⏱ Прогрев до {READY_TEMP}°C: медиана {_min(warmup['p50'])} "
+        f"({warmup['runs']} запусков)",
+    ]
+    for band in warmup["by_temp"]:
+        lines.append(
+            f"  {band['band']}: {_min(band['p50'])}, 90% — {_min(band['p90'])} "
+            f"({band['runs']})"
+        )
+    if warmup["slope"] is not None:
+        lines.append(f"  {warmup['slope']:+.1f} мин на 1°C улицы")
+    lines += [
+        "",
+        f"🔥 Подогреватель включился: {_pct(report['heater']['success_rate'])} "
+        f"из {report['heater']['checked']} проверок",
+    ]
+    if sag["percentiles"]:
+        p10, p50, p90 = sag["percentiles"]
+        lines.append(
+            f"🔋 Просадка напряжения: 10% — {p10:.2f} V, медиана {p50:.2f} V, "
+            f"90% — {p90:.2f} V; ниже порога {sag['threshold']} V: "
+            f"{_pct(sag['below_threshold'])}"
+        )
+    lines.append(
+        f"⌛ Прогрев не завершился за {MAX_CYCLES} циклов: "
+        f"{_pct(report['timeouts']['rate'])} из {report['timeouts']['runs']}"
+    )
+    near = report["thresholds"]
+    lines += [
+        "",
+        f"Прогрев при улице выше 0°C: {near['near_out_temp']} запусков, "
+        f"медиана {_min(near['near_out_temp_p50'])}",
+        f"Прогрев при двигателе от {READY_TEMP}°C: {near['near_engine_temp']}",
+    ]
+    if near["engine_at_start_p50"] is not None:
+        lines.append(
+            f"Температура двигателя при запуске: медиана "
+            f"{near['engine_at_start_p50']:.0f}°C (цель {READY_TEMP}°C)"
+        )
+    return "\n".join(lines)
+
+
+def report_text(days: int = 180, device_ids: Optional[Iterable[int]] = None) -> str:
+    started = time.perf_counter()
+    report = build_report(time.time() - days * 86400, device_ids=device_ids)
+    logger.info(
+        "Отчёт по %d запускам за %.3f сек",
+        report["runs"],
+        time.perf_counter() - started,
+    )
+    return format_report(report, days)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отчёт по холодным запускам")
+    parser.add_argument("--days", type=int, default=180, help="период, дней")
+    parser.add_argument(
+        "--device", type=int, action="append", help="ID устройства (можно несколько)"
+    )
+    args = parser.parse_args()
+    print(report_text(args.days, args.device))
+
+
+if __name__ == "__main__":
+    main()
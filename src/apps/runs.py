@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+
+from apps.algoritm import ColdStart
+from core.config import Account
+
+logger = logging.getLogger(__name__)
+
+
+class AlreadyRunning(Exception):
+    """Для авто уже выполняется холодный запуск."""
+
+    def __init__(self, run: "ActiveRun"):
+        self.run = run
+        super().__init__(f"уже выполняется: {run.cold_start.progress}")
+
+
+class ActiveRun:
+    def __init__(self, account: Account, device_id: int, cold_start: ColdStart):
+        self.account = account
+        self.device_id = device_id
+        self.cold_start = cold_start
+        self.job_id: Optional[str] = None  # фоновая задача, запустившая авто
+        self.task: Optional[asyncio.Task] = None
+
+
+class RunRegistry:
+    """Не более одного холодного запуска на авто одновременно.
+
+    Запуски из бота и по расписанию проходят через общий реестр:
+    повторный запуск того же авто присоединяется к идущему или
+    отклоняется с его текущим этапом.
+    """
+
+    def __init__(self):
+        self._runs: Dict[Tuple[str, int], ActiveRun] = {}
+
+    def get(self, account: Account, device_id: int) -> Optional[ActiveRun]:
+        run = self._runs.get((account.login, device_id))
+        if run is not None and run.task is not None and not run.task.done():
+            return run
+        return None
+
+    def active(self) -> List[ActiveRun]:
+        return [r for r in self._runs.values() if r.task and not r.task.done()]
+
+    def for_job(self, job_id: str) -> List[ActiveRun]:
+        return [r for r in self.active() if r.job_id == job_id]
+
+    async def run(
+        self,
+        cold_start: ColdStart,
+        account: Account,
+        device_id: int,
+        join: bool = True,
+        job_id: Optional[str] = None,
+        delay: float = 0,
+        limit: Optional[asyncio.Semaphore] = None,
+    ) -> Any:
+        """Выполняет запуск или ждёт уже идущий (join=False — AlreadyRunning).
+
+        С delay запуск регистрируется сразу и начинается через delay секунд:
+        пока он ждёт, авто считается занятым. limit ограничивает число
+        одновременно выполняемых запусков (ожидание в него не входит).
+        """
+        run = self.get(account, device_id)
+        if run is not None:
+            if not join:
+                raise AlreadyRunning(run)
+            logger.info(
+                "Холодный запуск [%s] %s уже идёт — ожидаем его",
+                account.name,
+                device_id,
+            )
+            # Отмена ожидающего не прерывает чужой запуск
+            return await asyncio.shield(run.task)
+
+        key = (account.login, device_id)
+        run = self._runs[key] = ActiveRun(account, device_id, cold_start)
+        run.job_id = job_id
+        run.task = asyncio.ensure_future(self._start(cold_start, delay, limit))
+        run.task.add_done_callback(
+            lambda _: self._runs.pop(key, None) if self._runs.get(key) is run else None
+        )
+        return await run.task
+
+    @staticmethod
+    async def _start(
+        cold_start: ColdStart, delay: float, limit: Optional[asyncio.Semaphore]
+    ) -> Any:
+        if delay:
+            cold_start.phase = "ожидание старта по прогнозу прогрева"
+            await asyncio.sleep(delay)
+        if limit is None:
+            return await cold_start.begin()
+        async with limit:
+            return await cold_start.begin()
+
+
+runs = RunRegistry()
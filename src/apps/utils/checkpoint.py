@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from core.config import CHECKPOINT_FILE
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore:
+    """Контрольные точки идущих холодных запусков на диске.
+
+    Запись обновляется на каждом этапе запуска и удаляется по его
+    завершении, поэтому после перезапуска процесса в файле остаются
+    только прерванные запуски.
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._data: Optional[Dict[str, Dict[str, Any]]] = None
+        # Процесс останавливается: прерванные запуски сохраняются для продолжения
+        self.suspended = False
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._data is not None:
+            return self._data
+        self._data = {}
+        if self._path.exists():
+            try:
+                with self._path.open("r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(
+                    "Не удалось прочитать контрольные точки %s: %s", self._path, e
+                )
+        return self._data
+
+    def _save(self):
+        self._path.parent.mkdir(exist_ok=True, parents=True)
+        tmp = self._path.with_suffix(".tmp")
+        try:
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self._path)
+        except OSError as e:
+            logger.warning(
+                "Не удалось сохранить контрольные точки %s: %s", self._path, e
+            )
+
+    @staticmethod
+    def key(account: str, device_id: int) -> str:
+        return f"{account}:{device_id}"
+
+    def save(self, key: str, **fields):
+        """Сохраняет состояние запуска."""
+        self._load()[key] = {**fields, "saved_at": time.time()}
+        self._save()
+
+    def remove(self, key: str):
+        if self._load().pop(key, None) is not None:
+            self._save()
+
+    def pending(self, max_age: float) -> List[Dict[str, Any]]:
+        """Прерванные запуски не старше max_age секунд; устаревшие удаляются."""
+        data = self._load()
+        now = time.time()
+        stale = [k for k, v in data.items() if now - v.get("saved_at", 0) > max_age]
+        for key in stale:
+            logger.info("Контрольная точка %s устарела", key)
+            data.pop(key)
+        if stale:
+            self._save()
+        return [dict(v) for v in data.values()]
+
+
+checkpoints = CheckpointStore(CHECKPOINT_FILE)
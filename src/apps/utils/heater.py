@@ -0,0 +1,108 @@
+import logging
+import math
+import statistics
+import time
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HEATER_ON = "on"
+HEATER_OFF = "off"
+HEATER_INCONCLUSIVE = "inconclusive"
+
+# Нижняя граница шума измерения напряжения, В
+VOLTAGE_NOISE_FLOOR = 0.05
+
+
+class HeaterVerdict:
+    """Результат определения работы подогревателя."""
+
+    def __init__(self, status: str, confidence: float, drop: Optional[float]):
+        self.status = status
+        self.confidence = confidence
+        self.drop = drop  # падение медианы напряжения относительно базы, В
+
+    def __repr__(self):
+        return (
+            f"HeaterVerdict({self.status}, confidence={self.confidence:.2f}, "
+            f"drop={self.drop})"
+        )
+
+
+class HeaterDetector:
+    """Статистическое определение включения подогревателя по напряжению.
+
+    База — медиана нескольких замеров до команды, серия — замеры сразу
+    после неё. Падение медианы серии сравнивается с половиной порога
+    с учётом разброса замеров; продолжающееся падение (тренд серии)
+    не даёт преждевременно признать подогреватель выключенным.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.2,
+        min_samples: int = 3,
+        min_off_samples: int = 6,
+        confidence: float = 0.95,
+    ):
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.min_off_samples = min_off_samples
+        self.confidence = confidence
+        self.baseline: List[float] = []
+        self.samples: List[Tuple[float, float]] = []  # (время, напряжение)
+
+    def add_baseline(self, voltage: Optional[float]):
+        if voltage is not None:
+            self.baseline.append(float(voltage))
+
+    def add_sample(self, voltage: Optional[float], at: Optional[float] = None):
+        if voltage is not None:
+            at = time.monotonic() if at is None else at
+            self.samples.append((at, float(voltage)))
+
+    def reset_samples(self):
+        self.samples = []
+
+    @staticmethod
+    def _spread(values: List[float]) -> float:
+        spread = statistics.stdev(values) if len(values) > 1 else 0.0
+        return max(spread, VOLTAGE_NOISE_FLOOR)
+
+    def _slope(self) -> float:
+        """Наклон напряжения в серии, В/сек (0 при недостатке данных)."""
+        if len(self.samples) < 3:
+            return 0.0
+        times = [t for t, _ in self.samples]
+        if max(times) == min(times):
+            return 0.0
+        values = [v for _, v in self.samples]
+        return statistics.linear_regression(times, values).slope
+
+    def verdict(self) -> HeaterVerdict:
+        if not self.baseline or len(self.samples) < self.min_samples:
+            return HeaterVerdict(HEATER_INCONCLUSIVE, 0.0, None)
+
+        values = [v for _, v in self.samples]
+        drop = statistics.median(self.baseline) - statistics.median(values)
+        # Стандартная ошибка разности медиан (~1.25 σ/√n)
+        se = 1.25 * math.sqrt(
+            self._spread(self.baseline) ** 2 / len(self.baseline)
+            + self._spread(values) ** 2 / len(values)
+        )
+        z = (drop - self.threshold / 2) / se
+        p_on = 0.5 * (1 + math.erf(z / math.sqrt(2)))
+
+        if p_on >= self.confidence and drop >= self.threshold:
+            return HeaterVerdict(HEATER_ON, p_on, drop)
+
+        duration = self.samples[-1][0] - self.samples[0][0]
+        still_falling = self._slope() * duration <= -self.threshold / 2
+        if (
+            1 - p_on >= self.confidence
+            and len(self.samples) >= self.min_off_samples
+            and not still_falling
+        ):
+            return HeaterVerdict(HEATER_OFF, 1 - p_on, drop)
+
+        return HeaterVerdict(HEATER_INCONCLUSIVE, max(p_on, 1 - p_on), drop)
@@ -0,0 +1,207 @@
+import math
+import struct
+import zlib
+from typing import Optional, List, Sequence, Tuple
+
+# Модуль без зависимостей проекта: выполняется в отдельном процессе
+
+Color = Tuple[int, int, int]
+
+WHITE = (255, 255, 255)
+GRID = (225, 225, 225)
+AXIS = (90, 90, 90)
+TEMP = (220, 60, 40)
+VOLTAGE = (40, 90, 200)
+TARGET = (60, 160, 60)
+
+# Шрифт 3x5 для подписей осей
+_FONT = {
+    "0": "111101101101111",
+    "1": "010110010010111",
+    "2": "111001111100111",
+    "3": "111001111001111",
+    "4": "101101111001001",
+    "5": "111100111001111",
+    "6": "111100111101111",
+    "7": "111001010010010",
+    "8": "111101111101111",
+    "9": "111101111001111",
+    "-": "000000111000000",
+    ".": "000000000000010",
+    "V": "101101101101010",
+    "C": "111100100100111",
+}
+
+
+class Canvas:
+    """RGB-изображение с простыми примитивами и записью в PNG."""
+
+    def __init__(self, width: int, height: int, background: Color = WHITE):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(bytes(background) * (width * height))
+
+    def point(self, x: int, y: int, color: Color):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            i = (y * self.width + x) * 3
+            self.pixels[i : i + 3] = bytes(color)
+
+    def rect(self, x0: int, y0: int, x1: int, y1: int, color: Color):
+        for y in range(max(y0, 0), min(y1, self.height)):
+            for x in range(max(x0, 0), min(x1, self.width)):
+                self.point(x, y, color)
+
+    def line(
+        self,
+        x0: int,
+        y0: int,
+        x1: int,
+        y1: int,
+        color: Color,
+        width: int = 1,
+        dash: int = 0,
+    ):
+        """Отрезок (алгоритм Брезенхэма); dash — длина штриха в точках."""
+        dx, dy = abs(x1 - x0), -abs(y1 - y0)
+        sx, sy = (1 if x0 < x1 else -1), (1 if y0 < y1 else -1)
+        err, step = dx + dy, 0
+        while True:
+            if not dash or (step // dash) % 2 == 0:
+                for ox in range(width):
+                    for oy in range(width):
+                        self.point(x0 + ox, y0 + oy, color)
+            if x0 == x1 and y0 == y1:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x0 += sx
+            if e2 <= dx:
+                err += dx
+                y0 += sy
+            step += 1
+
+    def text(self, x: int, y: int, text: str, color: Color, scale: int = 2):
+        for char in text:
+            glyph = _FONT.get(char)
+            if glyph is not None:
+                for i, bit in enumerate(glyph):
+                    if bit == "1":
+                        gx, gy = x + (i % 3) * scale, y + (i // 3) * scale
+                        self.rect(gx, gy, gx + scale, gy + scale, color)
+            x += 4 * scale
+
+    def png(self) -> bytes:
+        def chunk(kind: bytes, data: bytes) -> bytes:
+            body = kind + data
+            return (
+                struct.pack(">I", len(data))
+                + body
+                + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+            )
+
+        stride = self.width * 3
+        raw = b"".join(
+            b"\x00" + bytes(self.pixels[y * stride : (y + 1) * stride])
+            for y in range(self.height)
+        )
+        header = struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)
+        return (
+            b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw, 6))
+            + chunk(b"IEND", b"")
+        )
+
+
+def _ticks(lo: float, hi: float, count: int = 5) -> List[float]:
+    """Круглые деления шкалы в диапазоне [lo, hi]."""
+    raw = (hi - lo) / count or 1.0
+    magnitude = 10 ** math.floor(math.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw)
+    first = math.ceil(lo / step) * step
+    return [first + i * step for i in range(int((hi - first) / step) + 1)]
+
+
+def _label(value: float, ticks: Sequence[float]) -> str:
+    """Подпись деления: знаков после запятой столько, чтобы шаг был виден."""
+    step = ticks[1] - ticks[0] if len(ticks) > 1 else 1.0
+    digits = max(0, math.ceil(-math.log10(step) - 1e-9))
+    return f"{value:.{digits}f}"
+
+
+def render_chart(
+    times: Sequence[float],
+    temps: Sequence[Optional[float]],
+    voltages: Sequence[Optional[float]],
+    target: Optional[float] = None,
+    width: int = 800,
+    height: int = 400,
+) -> bytes:
+    """PNG с кривыми температуры двигателя (слева) и напряжения (справа).
+
+    По горизонтали — минуты от первого показания, target — уровень
+    целевой температуры пунктиром.
+    """
+    canvas = Canvas(width, height)
+    left, right, top, bottom = 60, width - 70, 20, height - 40
+
+    t0 = times[0]
+    t1 = max(times[-1], t0 + 60)
+
+    def scale(values: Sequence[Optional[float]], extra: Sequence[float] = ()):
+        known = [v for v in values if v is not None] + list(extra)
+        lo, hi = (min(known), max(known)) if known else (0.0, 1.0)
+        pad = (hi - lo) * 0.1 or 1.0
+        return lo - pad, hi + pad
+
+    temp_lo, temp_hi = scale(temps, [target] if target is not None else [])
+    volt_lo, volt_hi = scale(voltages)
+
+    def x_of(t: float) -> int:
+        return left + round((t - t0) / (t1 - t0) * (right - left))
+
+    def y_of(value: float, lo: float, hi: float) -> int:
+        return bottom - round((value - lo) / (hi - lo) * (bottom - top))
+
+    # Сетка и подписи
+    temp_ticks = _ticks(temp_lo, temp_hi)
+    for value in temp_ticks:
+        y = y_of(value, temp_lo, temp_hi)
+        canvas.line(left, y, right, y, GRID)
+        text = _label(value, temp_ticks) + "C"
+        canvas.text(left - 8 - len(text) * 8, y - 5, text, TEMP)
+    volt_ticks = _ticks(volt_lo, volt_hi)
+    for value in volt_ticks:
+        y = y_of(value, volt_lo, volt_hi)
+        text = _label(value, volt_ticks) + "V"
+        canvas.text(right + 8, y - 5, text, VOLTAGE)
+    for minute in _ticks(0, (t1 - t0) / 60, 8):
+        x = x_of(t0 + minute * 60)
+        canvas.line(x, top, x, bottom, GRID)
+        canvas.text(x - 4, bottom + 10, f"{minute:.0f}", AXIS)
+    canvas.line(left, bottom, right, bottom, AXIS)
+    canvas.line(left, top, left, bottom, AXIS)
+    canvas.line(right, top, right, bottom, AXIS)
+
+    if target is not None:
+        y = y_of(target, temp_lo, temp_hi)
+        canvas.line(left, y, right, y, TARGET, dash=6)
+
+    # Кривые: пропуски показаний разрывают линию
+    for values, lo, hi, color in (
+        (voltages, volt_lo, volt_hi, VOLTAGE),
+        (temps, temp_lo, temp_hi, TEMP),
+    ):
+        prev = None
+        for t, value in zip(times, values):
+            if value is None:
+                prev = None
+                continue
+            point = (x_of(t), y_of(value, lo, hi))
+            if prev is not None:
+                canvas.line(*prev, *point, color, width=2)
+            else:
+                canvas.point(*point, color)
+            prev = point
+    return canvas.png()
@@ -1,50 +1,74 @@
 import asyncio
+import datetime
 import logging
 from pytz import timezone
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from pathlib import Path
-import json
 
-from apps.algoritm import ColdStart
+from apps.fleet import run_fleet
+from apps.jobs import jobs
+from apps.utils.storage import load_schedule, save_schedule
+from core import settings
+from core.config import Account
 
 logger = logging.getLogger(__name__)
 
-# --- Настройки ---
-SCHEDULE_FILE = Path("/src/data/schedule.json")  # путь к JSON с расписанием
+# Один планировщик на все аккаунты. Пропущенные срабатывания одной задачи
+# объединяются в одно, а новое не стартует, пока идёт предыдущее.
+scheduler = AsyncIOScheduler(
+    timezone=timezone("Asia/Tomsk"),
+    job_defaults={"max_instances": 1, "coalesce": True, "misfire_grace_time": 600},
+)
 
-scheduler = AsyncIOScheduler(timezone=timezone("Asia/Tomsk"))
 
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
 
-# --- Вспомогательные функции ---
-def load_schedule() -> dict:
-    """Загружает расписание из JSON"""
-    if not SCHEDULE_FILE.exists():
-        return {
-            "mon": {"enabled": False, "time": None},
-            "tue": {"enabled": False, "time": None},
-            "wed": {"enabled": False, "time": None},
-            "thu": {"enabled": False, "time": None},
-            "fri": {"enabled": False, "time": None},
-            "sat": {"enabled": False, "time": None},
-            "sun": {"enabled": False, "time": None},
-        }
-    with SCHEDULE_FILE.open("r", encoding="utf-8") as f:
-        return json.load(f)
 
+def _ready_at(ready: str) -> float:
+    """Ближайшее время готовности авто "HH:MM" (unix)."""
+    hour, minute = map(int, ready.split(":"))
+    now = datetime.datetime.now(scheduler.timezone)
+    at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if at < now - datetime.timedelta(minutes=settings.warmup.max_lead):
+        at += datetime.timedelta(days=1)
+    return at.timestamp()
 
-def save_schedule(schedule: dict):
-    """Сохраняет расписание в JSON"""
-    SCHEDULE_FILE.parent.mkdir(exist_ok=True)
-    with SCHEDULE_FILE.open("w", encoding="utf-8") as f:
-        json.dump(schedule, f, indent=4, ensure_ascii=False)
+
+def _fire_time(day: str, hour: int, minute: int) -> tuple:
+    """День и время срабатывания задачи с опережением на прогрев.
+
+    Задача срабатывает за warmup.max_lead до готовности, а оставшуюся паузу
+    по прогнозу запуск выжидает, уже числясь в реестре запусков.
+    """
+    if not settings.warmup.enabled:
+        return day, hour, minute
+    total = hour * 60 + minute - settings.warmup.max_lead
+    if total < 0:
+        # Опережение переходит на предыдущий день
+        total += 24 * 60
+        day = DAYS[DAYS.index(day[:3]) - 1]
+    return day, total // 60, total % 60
 
 
 # --- ColdStart задача ---
-async def run_cold_start():
-    logger.info("Запуск ColdStart по расписанию")
-    cs = ColdStart()
-    await cs.begin()
+async def run_cold_start(account_name: str = None, target=None, ready: str = None):
+    account = settings.get_account(account_name)
+    logger.info(
+        "Запуск ColdStart по расписанию [%s] (цель: %s, готовность: %s)",
+        account.name,
+        target or "по умолчанию",
+        ready or "сразу",
+    )
+    ready_at = _ready_at(ready) if ready and settings.warmup.enabled else None
+    # Задача видна в /jobs и отменяется по /cancel
+    job = jobs.submit(
+        "Запуск по расписанию",
+        lambda job: run_fleet(
+            target, account=account, job_id=job.id, ready_at=ready_at
+        ),
+        accounts=[account.name],
+    )
+    await asyncio.wait([job.task])
 
 
 def schedule_cold_start():
@@ -54,11 +78,17 @@ def schedule_cold_start():
 
 # --- Планирование задач ---
 def schedule_all_tasks():
-    """Создаёт или обновляет все задачи планировщика на основании JSON"""
-    schedule = load_schedule()
+    """Создаёт или обновляет задачи планировщика всех аккаунтов"""
+    for account in settings.accounts:
+        schedule_account_tasks(account)
+
+
+def schedule_account_tasks(account: Account):
+    """Создаёт или обновляет задачи аккаунта на основании его JSON"""
+    schedule = load_schedule(account)
 
     for day, data in schedule.items():
-        job_id = f"cold_start_{day}"
+        job_id = f"cold_start_{account.name}_{day}"
 
         # Удаляем старую задачу
         try:
@@ -70,25 +100,32 @@ def schedule_all_tasks():
         # Добавляем новую задачу, если день включён
         if data.get("enabled") and data.get("time"):
             hour, minute = map(int, data["time"].split(":"))
+            # Задача срабатывает раньше; к заданному времени двигатель запущен
+            fire_day, hour, minute = _fire_time(day[:3], hour, minute)
             scheduler.add_job(
                 run_cold_start,
                 "cron",
-                day_of_week=day[:3],  # 'mon', 'tue', ...
+                day_of_week=fire_day,  # 'mon', 'tue', ...
                 hour=hour,
                 minute=minute,
                 id=job_id,
+                # "all", ID авто или группа; время готовности авто
+                args=[account.name, data.get("target"), data["time"]],
                 replace_existing=True,
             )
-            logger.info(f"Задача на {day} {data['time']} добавлена")
+            logger.info(f"Задача [{account.name}] на {day} {data['time']} добавлена")
 
 
 # --- Обновление конкретного дня (например, после изменения пользователем) ---
-def update_task(day: str, enabled: bool = None, time: str = None):
+def update_task(
+    day: str, enabled: bool = None, time: str = None, account: Account = None
+):
     """Обновляет задачу для конкретного дня и сохраняет в JSON"""
-    schedule = load_schedule()
+    account = account or settings.get_account()
+    schedule = load_schedule(account)
     if enabled is not None:
         schedule[day]["enabled"] = enabled
     if time is not None:
         schedule[day]["time"] = time
-    save_schedule(schedule)
-    schedule_all_tasks()  # пересоздаём задачи
+    save_schedule(schedule, account)
+    schedule_account_tasks(account)  # пересоздаём задачи
@@ -1,6 +1,9 @@
+import copy
 import json
+from pathlib import Path
 
-from core.config import SCHEDULE_FILE
+from core import settings
+from core.config import Account
 
 
 DEFAULT_SCHEDULE = {
@@ -14,25 +17,33 @@ DEFAULT_SCHEDULE = {
 }
 
 
-def load_schedule() -> dict:
-    if not SCHEDULE_FILE.exists():
-        return DEFAULT_SCHEDULE.copy()
-    with open(SCHEDULE_FILE, "r", encoding="utf-8") as f:
+def _schedule_file(account: Account | None) -> Path:
+    return (account or settings.get_account()).schedule_path
+
+
+def load_schedule(account: Account | None = None) -> dict:
+    schedule_file = _schedule_file(account)
+    if not schedule_file.exists():
+        return copy.deepcopy(DEFAULT_SCHEDULE)
+    with open(schedule_file, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def save_schedule(schedule: dict):
-    SCHEDULE_FILE.parent.mkdir(exist_ok=True, parents=True)
-    with open(SCHEDULE_FILE, "w", encoding="utf-8") as f:
+def save_schedule(schedule: dict, account: Account | None = None):
+    schedule_file = _schedule_file(account)
+    schedule_file.parent.mkdir(exist_ok=True, parents=True)
+    with open(schedule_file, "w", encoding="utf-8") as f:
         json.dump(schedule, f, ensure_ascii=False, indent=2)
 
 
-def get_schedule() -> dict:
-    return load_schedule()
+def get_schedule(account: Account | None = None) -> dict:
+    return load_schedule(account)
 
 
-def update_schedule(day: str, enabled: bool, time: str | None):
-    schedule = load_schedule()
+def update_schedule(
+    day: str, enabled: bool, time: str | None, account: Account | None = None
+):
+    schedule = load_schedule(account)
     schedule[day]["enabled"] = enabled
     schedule[day]["time"] = time
-    save_schedule(schedule)
+    save_schedule(schedule, account)
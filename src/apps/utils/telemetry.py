@@ -0,0 +1,680 @@
+import asyncio
+import logging
+import math
+import sqlite3
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict, Any, List, NamedTuple, Tuple
+
+from apps.pandora.state import PandoraState
+from core import settings
+from core.config import TELEMETRY_FILE
+
+logger = logging.getLogger(__name__)
+
+# Отсутствующее значение в буфере
+MISSING = -(2**31)
+# Напряжение хранится в сотых долях вольта
+VOLTAGE_SCALE = 100
+
+# Разрешения сводок, сек: минута, час, сутки
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+RESOLUTIONS = (MINUTE, HOUR, DAY)
+
+# Итоги холодных запусков: колонки истории запусков
+RUN_FIELDS = (
+    "device_id",
+    "started_at",
+    "test",
+    "result",
+    "out_temp",
+    "engine_temp_before",
+    "voltage_before",
+    "heater_on",
+    "heater_drop",
+    "cycles",
+    "warmup_minutes",
+    "warmup_timeout",
+    "engine_temp_after",
+    "finished_at",
+)
+
+HEATER_COMMAND = 21
+# Работающий двигатель, об/мин: подогреватель при нём не учитывается
+ENGINE_RPM = 100
+
+
+class Sample(NamedTuple):
+    """Показания устройства в момент ts (unix, сек); None — значения не было."""
+
+    ts: int
+    engine_temp: Optional[int]
+    out_temp: Optional[int]
+    voltage: Optional[float]
+    rpm: Optional[int]
+    command: Optional[int]  # последняя отправленная устройству команда
+
+
+def _pack(sample: Sample) -> tuple:
+    """Показания в целых числах: так они лежат и в буфере, и в SQLite."""
+
+    def integer(x, scale: int = 1) -> Optional[int]:
+        return None if x is None else round(x * scale)
+
+    return (
+        int(sample.ts),
+        integer(sample.engine_temp),
+        integer(sample.out_temp),
+        integer(sample.voltage, VOLTAGE_SCALE),
+        integer(sample.rpm),
+        sample.command,
+    )
+
+
+def _unpack(row: tuple) -> Sample:
+    ts, engine_temp, out_temp, voltage, rpm, command = row
+    return Sample(
+        ts,
+        engine_temp,
+        out_temp,
+        None if voltage is None else voltage / VOLTAGE_SCALE,
+        rpm,
+        command,
+    )
+
+
+class Rollup(NamedTuple):
+    """Сводка показаний устройства за интервал [bucket, bucket + resolution)."""
+
+    bucket: int
+    resolution: int
+    count: int
+    engine_min: Optional[int]
+    engine_max: Optional[int]
+    engine_mean: Optional[float]
+    out_min: Optional[int]
+    out_max: Optional[int]
+    out_mean: Optional[float]
+    voltage_min: Optional[float]
+    voltage_max: Optional[float]
+    voltage_mean: Optional[float]
+    heater_seconds: int  # время работы подогревателя
+
+
+# Сводки из показаний: подогреватель работает от показания с командой 21
+# при заглушенном двигателе до следующего показания (но не дольше max_gap)
+_ROLLUP_SAMPLES = f"""
+INSERT OR REPLACE INTO rollups
+SELECT device_id, {MINUTE}, bucket, COUNT(*),
+    MIN(engine_temp), MAX(engine_temp), AVG(engine_temp),
+    MIN(out_temp), MAX(out_temp), AVG(out_temp),
+    MIN(voltage) / {VOLTAGE_SCALE}.0, MAX(voltage) / {VOLTAGE_SCALE}.0,
+    AVG(voltage) / {VOLTAGE_SCALE}.0,
+    SUM(heater)
+FROM (
+    SELECT device_id, ts / {MINUTE} * {MINUTE} AS bucket,
+        engine_temp, out_temp, voltage,
+        CASE WHEN command = {HEATER_COMMAND} AND IFNULL(rpm, 0) <= {ENGINE_RPM}
+            THEN MIN(IFNULL(LEAD(ts) OVER w, ts) - ts, :max_gap)
+            ELSE 0 END AS heater
+    FROM samples
+    WHERE ts >= :since AND ts < :until
+    WINDOW w AS (PARTITION BY device_id ORDER BY ts)
+)
+GROUP BY device_id, bucket
+"""
+
+
+def _weighted(column: str) -> str:
+    return (
+        f"SUM({column} * count) / "
+        f"SUM(CASE WHEN {column} IS NOT NULL THEN count END)"
+    )
+
+
+# Сводки из более мелких сводок: среднее взвешивается по числу показаний
+_MERGE = f"""
+    SUM(count),
+    MIN(engine_min), MAX(engine_max), {_weighted("engine_mean")},
+    MIN(out_min), MAX(out_max), {_weighted("out_mean")},
+    MIN(voltage_min), MAX(voltage_max), {_weighted("voltage_mean")},
+    SUM(heater_seconds)
+"""
+
+_ROLLUP_ROLLUPS = f"""
+INSERT OR REPLACE INTO rollups
+SELECT device_id, :resolution, bucket / :resolution * :resolution AS b, {_MERGE}
+FROM rollups
+WHERE resolution = :source AND bucket >= :since AND bucket < :until
+GROUP BY device_id, b
+"""
+
+
+class _Buffer:
+    """Ещё не записанные на диск показания устройства по колонкам."""
+
+    def __init__(self):
+        self.columns = [array("q")] + [array("i") for _ in range(5)]
+        self.sealed = 0  # первые строки, уже переданные на запись
+
+    def __len__(self) -> int:
+        return len(self.columns[0])
+
+    def append(self, sample: Sample):
+        row = [MISSING if x is None else x for x in _pack(sample)]
+        if len(self) > self.sealed and self.columns[0][-1] == row[0]:
+            # Одно показание в секунду, как и на диске: остаётся последнее
+            for column, value in zip(self.columns, row):
+                column[-1] = value
+            return
+        for column, value in zip(self.columns, row):
+            column.append(value)
+
+    def rows(self):
+        for row in zip(*self.columns):
+            yield tuple(None if x == MISSING else x for x in row)
+
+    def drop(self, count: int):
+        """Удаляет первые count строк, записанные на диск."""
+        for column in self.columns:
+            del column[:count]
+        self.sealed = max(self.sealed - count, 0)
+
+
+class TelemetryStore:
+    """Архив показаний устройств: буфер в памяти и SQLite на диске.
+
+    Показания только дописываются. Повтор тех же значений пишется не чаще
+    heartbeat, поэтому в простое архив почти не растёт. Таблица упорядочена
+    по (device_id, ts), и выборка за период читает только его строки.
+
+    Запись и построение сводок идут в отдельном потоке со своим
+    соединением, чтобы не останавливать цикл событий; чтение (WAL)
+    выполняется параллельно через соединение потока цикла.
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._db: Optional[sqlite3.Connection] = None  # чтение
+        self._writer_db: Optional[sqlite3.Connection] = None  # поток записи
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._flushing: Optional[asyncio.Task] = None
+        self._buffers: Dict[int, _Buffer] = {}
+        self._last: Dict[int, Sample] = {}
+        # Последняя команда устройству и время её отправки
+        self._commands: Dict[int, Tuple[int, float]] = {}
+        self._flushed_at = time.monotonic()
+        self._compacted_at = 0.0
+
+    def _open(self) -> sqlite3.Connection:
+        self._path.parent.mkdir(exist_ok=True, parents=True)
+        db = sqlite3.connect(self._path)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS samples ("
+                " device_id INTEGER NOT NULL,"
+                " ts INTEGER NOT NULL,"
+                " engine_temp INTEGER,"
+                " out_temp INTEGER,"
+                " voltage INTEGER,"
+                " rpm INTEGER,"
+                " command INTEGER,"
+                " PRIMARY KEY (device_id, ts)"
+                ") WITHOUT ROWID"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS rollups ("
+                " device_id INTEGER NOT NULL,"
+                " resolution INTEGER NOT NULL,"
+                " bucket INTEGER NOT NULL,"
+                " count INTEGER NOT NULL,"
+                " engine_min INTEGER, engine_max INTEGER, engine_mean REAL,"
+                " out_min INTEGER, out_max INTEGER, out_mean REAL,"
+                " voltage_min REAL, voltage_max REAL, voltage_mean REAL,"
+                " heater_seconds INTEGER NOT NULL,"
+                " PRIMARY KEY (device_id, resolution, bucket)"
+                ") WITHOUT ROWID"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cold_starts ("
+                " device_id INTEGER NOT NULL,"
+                " started_at REAL NOT NULL,"
+                " test INTEGER, result TEXT,"
+                " out_temp REAL, engine_temp_before REAL, voltage_before REAL,"
+                " heater_on INTEGER, heater_drop REAL, cycles INTEGER,"
+                " warmup_minutes REAL, warmup_timeout INTEGER,"
+                " engine_temp_after REAL, finished_at REAL,"
+                " PRIMARY KEY (started_at, device_id)"
+                ")"
+            )
+            # Колонки, добавленные после создания таблицы
+            existing = {row[1] for row in db.execute("PRAGMA table_info(cold_starts)")}
+            for name in RUN_FIELDS:
+                if name not in existing:
+                    db.execute(f"ALTER TABLE cold_starts ADD COLUMN {name}")
+        except sqlite3.Error:
+            db.close()
+            raise
+        return db
+
+    def _connect(self) -> sqlite3.Connection:
+        """Соединение для чтения (поток цикла событий)."""
+        if self._db is None:
+            self._db = self._open()
+        return self._db
+
+    def _writer(self) -> sqlite3.Connection:
+        """Соединение для записи (только поток записи)."""
+        if self._writer_db is None:
+            self._writer_db = self._open()
+        return self._writer_db
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            # Один поток: записи на диск идут по очереди
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="telemetry"
+            )
+        return self._executor
+
+    def set_command(self, device_id: int, command: int):
+        """Отмечает команду, отправленную устройству; она пишется в показания."""
+        self._commands[device_id] = (command, time.time())
+
+    def _command(self, device_id: int) -> Optional[int]:
+        command, sent_at = self._commands.get(device_id, (None, 0.0))
+        if time.time() - sent_at > settings.telemetry.command_ttl:
+            return None
+        return command
+
+    def record(self, state: PandoraState):
+        """Добавляет показания из состояния устройства (подписчик опроса)."""
+        if state.device_id is None:
+            return
+        device_id = int(state.device_id)
+        sample = Sample(
+            int(state.updated_at or time.time()),
+            state.engine_temp,
+            state.out_temp,
+            state.voltage,
+            state.engine_rpm,
+            self._command(device_id),
+        )
+        last = self._last.get(device_id)
+        if (
+            last is not None
+            and last[1:] == sample[1:]
+            and sample.ts - last.ts < settings.telemetry.heartbeat
+        ):
+            return
+        self._last[device_id] = sample
+        self._buffers.setdefault(device_id, _Buffer()).append(sample)
+
+        pending = sum(len(b) for b in self._buffers.values())
+        if (
+            pending >= settings.telemetry.flush_size
+            or time.monotonic() - self._flushed_at >= settings.telemetry.flush_interval
+        ):
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        self._flushed_at = time.monotonic()
+        if self._flushing is not None and not self._flushing.done():
+            return  # идущая запись заберёт и новые показания
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()  # вне цикла событий (скрипты) пишем сразу
+            return
+        self._flushing = loop.create_task(self._flush())
+
+    def _take(self) -> Tuple[List[tuple], Dict[int, int]]:
+        """Строки буферов для записи и их число по устройствам."""
+        counts = {d: len(b) for d, b in self._buffers.items() if len(b)}
+        rows = [
+            (device_id, *row)
+            for device_id in counts
+            for row in self._buffers[device_id].rows()
+        ]
+        for device_id, count in counts.items():
+            self._buffers[device_id].sealed = count
+        return rows, counts
+
+    def _release(self, counts: Dict[int, int], written: bool):
+        for device_id, count in counts.items():
+            buffer = self._buffers[device_id]
+            if written:
+                buffer.drop(count)
+            else:
+                # Строки остаются в буфере до следующей попытки
+                buffer.sealed = 0
+
+    async def _flush(self):
+        """Записывает буферы в потоке записи, пока в них есть показания."""
+        loop = asyncio.get_running_loop()
+        while True:
+            rows, counts = self._take()
+            if not rows:
+                return
+            try:
+                await loop.run_in_executor(self._pool(), self._write, rows)
+            except sqlite3.Error as e:
+                logger.warning("Не удалось записать телеметрию %s: %s", self._path, e)
+                self._release(counts, written=False)
+                return
+            self._release(counts, written=True)
+
+    def flush(self):
+        """Записывает буферы на диск, дожидаясь записи (вне цикла событий)."""
+        self._flushed_at = time.monotonic()
+        rows, counts = self._take()
+        if not rows:
+            return
+        try:
+            self._pool().submit(self._write, rows).result()
+        except sqlite3.Error as e:
+            logger.warning("Не удалось записать телеметрию %s: %s", self._path, e)
+            self._release(counts, written=False)
+            return
+        self._release(counts, written=True)
+
+    def _write(self, rows: List[tuple]):
+        """Поток записи: показания на диск и сводки по расписанию."""
+        db = self._writer()
+        with db:
+            db.executemany(
+                "INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        logger.debug("Телеметрия: записано %d показаний", len(rows))
+        if time.monotonic() - self._compacted_at >= settings.telemetry.compact_interval:
+            self._compact(time.time())
+
+    # ---------------------------
+    # Сводки и срок хранения
+    # ---------------------------
+    def compact(self, now: Optional[float] = None):
+        """Достраивает сводки по завершённым интервалам и удаляет устаревшее.
+
+        Дожидается результата, поэтому вызывается вне цикла событий; в работе
+        сводки строит поток записи после очередной записи показаний.
+        """
+        self.flush()
+        if not self._path.exists():
+            return
+        self._pool().submit(self._compact, time.time() if now is None else now).result()
+
+    def _compact(self, now: float):
+        """Поток записи: сводки пересчитываются с последнего построенного
+        интервала, поэтому каждый запуск обрабатывает только новые показания.
+        """
+        self._compacted_at = time.monotonic()
+        config = settings.telemetry
+        try:
+            db = self._writer()
+            with db:
+                source, until = None, int(now)
+                for resolution in RESOLUTIONS:
+                    until = until // resolution * resolution
+                    (since,) = db.execute(
+                        "SELECT IFNULL(MAX(bucket), 0) FROM rollups"
+                        " WHERE resolution = ?",
+                        (resolution,),
+                    ).fetchone()
+                    if source is None:
+                        db.execute(
+                            _ROLLUP_SAMPLES,
+                            {
+                                "since": since,
+                                "until": until,
+                                "max_gap": config.heartbeat,
+                            },
+                        )
+                    else:
+                        db.execute(
+                            _ROLLUP_ROLLUPS,
+                            {
+                                "resolution": resolution,
+                                "source": source,
+                                "since": since,
+                                "until": until,
+                            },
+                        )
+                    source = resolution
+
+                # Удаляются только данные, уже вошедшие в сводку крупнее
+                minute_until = int(now) // MINUTE * MINUTE
+                hour_until = minute_until // HOUR * HOUR
+                day_until = hour_until // DAY * DAY
+                db.execute(
+                    "DELETE FROM samples WHERE ts < ?",
+                    (min(now - config.raw_days * DAY, minute_until),),
+                )
+                for resolution, days, covered in (
+                    (MINUTE, config.minute_days, hour_until),
+                    (HOUR, config.hour_days, day_until),
+                ):
+                    db.execute(
+                        "DELETE FROM rollups WHERE resolution = ? AND bucket < ?",
+                        (resolution, min(now - days * DAY, covered)),
+                    )
+        except sqlite3.Error as e:
+            logger.warning("Не удалось построить сводки телеметрии: %s", e)
+
+    def _retained(self, resolution: int, start: float, now: float) -> bool:
+        """Хранятся ли сводки этого разрешения начиная с start."""
+        days = {
+            MINUTE: settings.telemetry.minute_days,
+            HOUR: settings.telemetry.hour_days,
+        }.get(resolution)
+        return days is None or start >= now - days * DAY
+
+    def resolution_for(self, start: float, step: int) -> int:
+        """Самое крупное хранимое разрешение не крупнее step, покрывающее start."""
+        now = time.time()
+        retained = [r for r in RESOLUTIONS if self._retained(r, start, now)]
+        fitting = [r for r in retained if r <= step]
+        return max(fitting) if fitting else min(retained)
+
+    def history(
+        self,
+        device_id: int,
+        start: float,
+        end: Optional[float] = None,
+        step: int = HOUR,
+    ) -> List[Rollup]:
+        """Сводки устройства за период с шагом step (не мельче минуты).
+
+        Читаются сводки самого крупного подходящего разрешения и при
+        необходимости объединяются до шага step.
+        """
+        if self._db is None and not self._path.exists():
+            return []
+        end = time.time() if end is None else end
+        resolution = self.resolution_for(start, step)
+        step = max(step, resolution)
+        try:
+            cursor = self._connect().execute(
+                f"SELECT bucket / :step * :step AS b, :step, {_MERGE}"
+                " FROM rollups WHERE device_id = :device_id"
+                " AND resolution = :resolution"
+                " AND bucket >= :start AND bucket < :end"
+                " GROUP BY b ORDER BY b",
+                {
+                    "step": step,
+                    "device_id": device_id,
+                    "resolution": resolution,
+                    "start": math.floor(start) // resolution * resolution,
+                    "end": math.ceil(end),
+                },
+            )
+            return [Rollup(*row) for row in cursor]
+        except sqlite3.Error as e:
+            logger.warning("Не удалось прочитать сводки телеметрии: %s", e)
+            return []
+
+    def summary(
+        self, device_id: int, start: float, end: Optional[float] = None
+    ) -> Optional[Rollup]:
+        """Одна сводка за весь период (например, за зиму) по суточным данным."""
+        rollups = self.history(device_id, start, end, step=DAY)
+        if not rollups:
+            return None
+
+        def values(i: int) -> List:
+            return [r[i] for r in rollups if r[i] is not None]
+
+        def weighted(i: int) -> Optional[float]:
+            pairs = [(r[i], r.count) for r in rollups if r[i] is not None]
+            total = sum(n for _, n in pairs)
+            return sum(v * n for v, n in pairs) / total if total else None
+
+        return Rollup(
+            rollups[0].bucket,
+            rollups[-1].bucket + rollups[-1].resolution - rollups[0].bucket,
+            sum(r.count for r in rollups),
+            min(values(3), default=None),
+            max(values(4), default=None),
+            weighted(5),
+            min(values(6), default=None),
+            max(values(7), default=None),
+            weighted(8),
+            min(values(9), default=None),
+            max(values(10), default=None),
+            weighted(11),
+            sum(r.heater_seconds for r in rollups),
+        )
+
+    # ---------------------------
+    # История холодных запусков
+    # ---------------------------
+    def record_run(self, **fields):
+        """Сохраняет итоги холодного запуска (поля RUN_FIELDS) в потоке записи."""
+        row = [fields.get(name) for name in RUN_FIELDS]
+        future = self._pool().submit(self._insert_run, row)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            future.result()  # вне цикла событий дожидаемся записи
+
+    def _insert_run(self, row: list):
+        try:
+            db = self._writer()
+            with db:
+                db.execute(
+                    f"INSERT OR REPLACE INTO cold_starts ({', '.join(RUN_FIELDS)})"
+                    f" VALUES ({', '.join('?' * len(RUN_FIELDS))})",
+                    row,
+                )
+        except sqlite3.Error as e:
+            logger.warning("Не удалось сохранить итоги запуска: %s", e)
+
+    def cold_starts(
+        self,
+        start: float = 0,
+        end: Optional[float] = None,
+        include_test: bool = False,
+    ) -> Dict[str, list]:
+        """Итоги запусков за период по колонкам (имя поля -> значения)."""
+        columns: Dict[str, list] = {name: [] for name in RUN_FIELDS}
+        if self._db is None and not self._path.exists():
+            return columns
+        sql = (
+            f"SELECT {', '.join(RUN_FIELDS)} FROM cold_starts"
+            " WHERE started_at BETWEEN ? AND ?"
+        )
+        if not include_test:
+            sql += " AND NOT IFNULL(test, 0)"
+        try:
+            rows = self._connect().execute(
+                sql, (start, time.time() if end is None else end)
+            )
+            for row in rows:
+                for name, value in zip(RUN_FIELDS, row):
+                    columns[name].append(value)
+        except sqlite3.Error as e:
+            logger.warning("Не удалось прочитать историю запусков: %s", e)
+        return columns
+
+    def last_run(self, device_id: int) -> Optional[Dict[str, Any]]:
+        """Итоги последнего запуска устройства (включая тестовые)."""
+        if self._db is None and not self._path.exists():
+            return None
+        try:
+            row = (
+                self._connect()
+                .execute(
+                    f"SELECT {', '.join(RUN_FIELDS)} FROM cold_starts"
+                    " WHERE device_id = ? ORDER BY started_at DESC LIMIT 1",
+                    (device_id,),
+                )
+                .fetchone()
+            )
+        except sqlite3.Error as e:
+            logger.warning("Не удалось прочитать историю запусков: %s", e)
+            return None
+        return dict(zip(RUN_FIELDS, row)) if row else None
+
+    def query(
+        self,
+        device_id: int,
+        start: float,
+        end: Optional[float] = None,
+    ) -> List[Sample]:
+        """Показания устройства за период [start, end] по возрастанию времени."""
+        start = math.floor(start)
+        end = math.floor(time.time() if end is None else end)
+        samples: List[Sample] = []
+        if self._db is not None or self._path.exists():
+            try:
+                cursor = self._connect().execute(
+                    "SELECT ts, engine_temp, out_temp, voltage, rpm, command"
+                    " FROM samples WHERE device_id = ? AND ts BETWEEN ? AND ?"
+                    " ORDER BY ts",
+                    (device_id, start, end),
+                )
+                samples = [_unpack(row) for row in cursor]
+            except sqlite3.Error as e:
+                logger.warning("Не удалось прочитать телеметрию %s: %s", self._path, e)
+        buffer = self._buffers.get(device_id)
+        if buffer is None:
+            return samples
+        # Строки, уже записанные потоком записи, могут быть ещё и в буфере:
+        # за каждую секунду остаётся последнее показание
+        merged = {s.ts: s for s in samples}
+        for row in buffer.rows():
+            if start <= row[0] <= end:
+                merged[row[0]] = _unpack(row)
+        return list(merged.values())
+
+    def last_hours(self, device_id: int, hours: float) -> List[Sample]:
+        return self.query(device_id, time.time() - hours * 3600)
+
+    def _close_writer(self):
+        if self._writer_db is not None:
+            self._writer_db.close()
+            self._writer_db = None
+
+    async def close(self):
+        """Дописывает буферы и закрывает архив."""
+        if self._flushing is not None:
+            await self._flushing
+        await self._flush()
+        if self._executor is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._close_writer
+            )
+            self._executor.shutdown()
+            self._executor = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+telemetry = TelemetryStore(TELEMETRY_FILE)
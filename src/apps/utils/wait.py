@@ -0,0 +1,36 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+async def wait_until(
+    predicate: Callable[[], bool],
+    probe: Callable[[], Awaitable[Any]],
+    timeout: float,
+    interval: float = 5,
+    max_interval: float = 60,
+    factor: float = 1.5,
+) -> bool:
+    """Опрашивает probe() до выполнения predicate() или истечения timeout.
+
+    Интервал опроса начинается с interval и растёт в factor раз до
+    max_interval. Возвращает True, как только условие выполнено,
+    и результат predicate() после последнего опроса при таймауте.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    if predicate():
+        return True
+
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            logger.debug("Условие не выполнено за %s сек", timeout)
+            return predicate()
+        await asyncio.sleep(min(interval, remaining))
+        await probe()
+        if predicate():
+            return True
+        interval = min(interval * factor, max_interval)
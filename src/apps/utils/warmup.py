@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+from core import settings
+from core.config import WARMUP_FILE
+
+logger = logging.getLogger(__name__)
+
+# Условия холодного запуска: прогрев нужен только при их выполнении
+COLD_OUT_TEMP = 5
+COLD_ENGINE_TEMP = 30
+
+FEATURES = ("out_temp", "engine_temp", "voltage")
+
+
+def _solve(a: List[List[float]], b: List[float]) -> List[float]:
+    """Решение системы линейных уравнений методом Гаусса."""
+    n = len(b)
+    m = [row[:] + [b[i]] for i, row in enumerate(a)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+        m[col], m[pivot] = m[pivot], m[col]
+        for r in range(n):
+            if r != col and m[col][col]:
+                k = m[r][col] / m[col][col]
+                m[r] = [x - k * y for x, y in zip(m[r], m[col])]
+    return [m[i][n] / m[i][i] if m[i][i] else 0.0 for i in range(n)]
+
+
+class WarmupModel:
+    """Прогноз времени холодного запуска по истории наших запусков.
+
+    Каждый прогрев сохраняет условия старта (температура улицы и
+    двигателя, напряжение) и минуты до запуска двигателя. Прогрев, не
+    завершившийся за отведённое время, — цензурированное наблюдение:
+    его минуты лишь нижняя граница. Прогноз — гребневая линейная
+    регрессия на нормированных признаках; пока завершённых запусков
+    мало, используется время по умолчанию.
+    """
+
+    def __init__(self, path: Path, ridge: float = 1.0):
+        self._path = path
+        self._runs: Optional[List[Dict[str, Any]]] = None
+        # Веса модели и нормировка признаков (среднее, отклонение)
+        self._coef: Optional[Tuple[List[float], List[Tuple[float, float]]]] = None
+        self.ridge = ridge
+
+    def _load(self) -> List[Dict[str, Any]]:
+        if self._runs is not None:
+            return self._runs
+        self._runs = []
+        if self._path.exists():
+            try:
+                with self._path.open("r", encoding="utf-8") as f:
+                    self._runs = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(
+                    "Не удалось прочитать историю прогревов %s: %s", self._path, e
+                )
+        return self._runs
+
+    def _save(self):
+        self._path.parent.mkdir(exist_ok=True, parents=True)
+        tmp = self._path.with_suffix(".tmp")
+        try:
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(self._runs, f, ensure_ascii=False)
+            os.replace(tmp, self._path)
+        except OSError as e:
+            logger.warning(
+                "Не удалось сохранить историю прогревов %s: %s", self._path, e
+            )
+
+    def add(
+        self,
+        out_temp: Optional[float],
+        engine_temp: Optional[float],
+        voltage: Optional[float],
+        minutes: float,
+        censored: bool = False,
+    ):
+        """Сохраняет прогрев и переобучает модель.
+
+        censored=True — двигатель не прогрелся за minutes минут.
+        """
+        if None in (out_temp, engine_temp, voltage):
+            return
+        runs = self._load()
+        run = {
+            "out_temp": out_temp,
+            "engine_temp": engine_temp,
+            "voltage": voltage,
+            "minutes": round(minutes, 1),
+            "at": time.time(),
+        }
+        if censored:
+            run["censored"] = True
+        runs.append(run)
+        del runs[: max(len(runs) - settings.warmup.history, 0)]
+        self._coef = None
+        self._save()
+        logger.info(
+            "Прогрев %s%.1f мин сохранён (улица %s°C, двигатель %s°C)",
+            "более " if censored else "",
+            minutes,
+            out_temp,
+            engine_temp,
+        )
+
+    def _fit(self) -> Optional[Tuple[List[float], List[Tuple[float, float]]]]:
+        """Коэффициенты модели или None, если завершённых запусков мало."""
+        if self._coef is not None:
+            return self._coef
+        runs = self._load()
+        complete = [r for r in runs if not r.get("censored")]
+        if len(complete) < settings.warmup.min_runs:
+            return None
+        model = self._regress(complete)
+        # Незавершённый прогрев учитывается на своей нижней границе, если
+        # прогноз для него короче времени, за которое двигатель не прогрелся
+        longer = [
+            r
+            for r in runs
+            if r.get("censored")
+            and self._apply(model, [r[name] for name in FEATURES]) < r["minutes"]
+        ]
+        if longer:
+            model = self._regress(complete + longer)
+        self._coef = model
+        return self._coef
+
+    def _regress(
+        self, runs: List[Dict[str, Any]]
+    ) -> Tuple[List[float], List[Tuple[float, float]]]:
+        # Нормировка: гребневый штраф одинаково действует на все признаки
+        scale = []
+        for name in FEATURES:
+            values = [r[name] for r in runs]
+            scale.append((statistics.fmean(values), statistics.pstdev(values) or 1.0))
+        rows = [
+            [1.0] + [(r[name] - m) / s for name, (m, s) in zip(FEATURES, scale)]
+            for r in runs
+        ]
+        y = [r["minutes"] for r in runs]
+        n = len(FEATURES) + 1
+        a = [
+            [
+                sum(row[i] * row[j] for row in rows) + (self.ridge if i == j > 0 else 0)
+                for j in range(n)
+            ]
+            for i in range(n)
+        ]
+        b = [sum(row[i] * t for row, t in zip(rows, y)) for i in range(n)]
+        return _solve(a, b), scale
+
+    @staticmethod
+    def _apply(
+        model: Tuple[List[float], List[Tuple[float, float]]], values: List[float]
+    ) -> float:
+        weights, scale = model
+        x = [1.0] + [(value - m) / s for value, (m, s) in zip(values, scale)]
+        return sum(w * v for w, v in zip(weights, x))
+
+    def predict(
+        self,
+        out_temp: Optional[float],
+        engine_temp: Optional[float],
+        voltage: Optional[float],
+    ) -> float:
+        """Прогноз минут от начала процедуры до запуска двигателя."""
+        default = float(min(settings.warmup.default_minutes, settings.warmup.max_lead))
+        if out_temp is None or engine_temp is None:
+            return default
+        if out_temp > COLD_OUT_TEMP or engine_temp >= COLD_ENGINE_TEMP:
+            return 0.0  # тёплый запуск без прогрева
+        model = self._fit()
+        if model is None or voltage is None:
+            return default
+        minutes = self._apply(model, [out_temp, engine_temp, voltage])
+        return min(max(minutes, 0.0), float(settings.warmup.max_lead))
+
+
+warmup_model = WarmupModel(WARMUP_FILE)
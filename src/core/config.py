@@ -1,9 +1,9 @@
 import logging
 from pathlib import Path
-from typing import Literal, List
+from typing import Literal, List, Dict, Optional
 
 from aiogram import Bot
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -13,6 +13,12 @@ LOG_DEFAULT_FORMAT = (
 )
 
 SCHEDULE_FILE = BASE_DIR / "data/schedule.json"
+SESSION_FILE = BASE_DIR / "data/session.json"
+CHECKPOINT_FILE = BASE_DIR / "data/checkpoints.json"
+TELEMETRY_FILE = BASE_DIR / "data/telemetry.db"
+WARMUP_FILE = BASE_DIR / "data/warmup.json"
+
+DEFAULT_ACCOUNT = "default"
 
 
 class LoggingConfig(BaseModel):
@@ -35,6 +41,14 @@ class Telegram(BaseModel):
     token: str
     admin_chat_ids: List[int]
     chat_id: int
+    # Карточка статуса запуска редактируется не чаще раза в указанное число секунд
+    card_interval: int = 10
+    # Ограничения Bot API: пауза между сообщениями в один чат, сек,
+    # и сообщений в секунду на всех
+    chat_interval: float = 1.0
+    global_rate: int = 25
+    # Повторы при сетевых ошибках Telegram
+    send_attempts: int = 5
 
     @field_validator("admin_chat_ids", mode="before")
     def parse_admin_ids(cls, v):
@@ -49,8 +63,179 @@ class Telegram(BaseModel):
 
 
 class Pandora(BaseModel):
+    # Аккаунт по умолчанию; можно не задавать, если указан список accounts
+    login: str = ""
+    password: str = ""
+    # Запрос отправляется сразу с сохранёнными cookies, логин — только по ошибке сессии
+    optimistic_auth: bool = True
+    # Не чаще одного запроса /iamalive за указанное число секунд
+    alive_ttl: int = 300
+    # Период полного снимка /updates?ts=-1, между ними запрашиваются только изменения
+    updates_full_every: int = 900
+
+
+class Http(BaseModel):
+    # Всего соединений в общем пуле и на один хост (p-on.ru)
+    limit: int = 20
+    limit_per_host: int = 10
+    # Сколько держать простаивающее соединение открытым, сек
+    keepalive_timeout: int = 60
+    # Кэш DNS-ответов, сек
+    ttl_dns_cache: int = 600
+    # Общий таймаут запроса, сек
+    timeout: int = 30
+
+
+class RetryPolicy(BaseModel):
+    # Число повторов после первой попытки
+    attempts: int = 3
+    # Пауза перед первым повтором, дальше растёт в factor раз до max_delay, сек
+    delay: float = 1
+    factor: float = 2
+    max_delay: float = 30
+    # Случайный разброс паузы: 0.5 — от 50% до 100% расчётного значения
+    jitter: float = 0.5
+
+
+class Retry(BaseModel):
+    # Политики по классам ошибок: session, gsm, server (5xx), client (400), connection
+    policies: Dict[str, RetryPolicy] = {
+        "session": RetryPolicy(attempts=2, delay=0),
+        "gsm": RetryPolicy(delay=5, max_delay=20),
+        "server": RetryPolicy(delay=2),
+        "client": RetryPolicy(attempts=2, delay=5),
+        "connection": RetryPolicy(delay=2),
+    }
+    # Переопределения для отдельных запросов: {"/updates": {"server": {...}}}
+    endpoints: Dict[str, Dict[str, RetryPolicy]] = {
+        # Команды повторяются только при гарантированной недоставке,
+        # поэтому повторы частые
+        "/devices/command": {
+            "gsm": RetryPolicy(delay=2, max_delay=10),
+            "connection": RetryPolicy(attempts=5, delay=0.5, max_delay=5),
+        },
+        # Без повторов: фоновый опрос сам повторит запрос через интервал
+        "/updates": {
+            "server": RetryPolicy(attempts=0),
+            "connection": RetryPolicy(attempts=0),
+        },
+    }
+    # Общий лимит времени на запрос со всеми повторами, сек
+    deadline: float = 60
+    # Сколько подряд отказов API открывают автомат и на сколько секунд
+    breaker_threshold: int = 5
+    breaker_reset: float = 30
+
+
+class Commands(BaseModel):
+    # Сколько раз отправлять команду, если устройство подтвердило, что её не получило
+    attempts: int = 3
+    # Ожидание подтверждения команды по состоянию устройства, сек
+    confirm_timeout: int = 30
+    # Срок жизни команды в очереди, пока устройство не на связи, сек
+    queue_ttl: int = 600
+    # Срок жизни запроса статуса (255) в очереди, сек
+    status_ttl: int = 60
+    # Повторная попытка доставки без признаков выхода устройства на связь, сек
+    unreachable_interval: int = 30
+
+
+class Resume(BaseModel):
+    # Продолжать прерванные перезапуском холодные запуски
+    enabled: bool = True
+    # Контрольные точки старше этого возраста не продолжаются, сек
+    max_age: int = 3600
+
+
+class Poller(BaseModel):
+    # Интервал фонового опроса /updates во время холодного запуска, сек
+    active_interval: int = 15
+    # Интервал без активных запусков (пока есть подписчики), сек
+    idle_interval: int = 300
+    # Повторный запрос статуса (255) устройству не чаще, сек
+    wake_dedup: int = 10
+    # /status отвечает из кэша, если данные моложе, сек
+    status_ttl: int = 120
+
+
+class Telemetry(BaseModel):
+    # Сохранять показания устройств в архив телеметрии
+    enabled: bool = True
+    # Неизменные показания записываются не чаще, сек
+    heartbeat: int = 600
+    # Запись на диск при накоплении показаний
+    flush_size: int = 100
+    # Запись на диск не реже, сек
+    flush_interval: int = 300
+    # Команда считается действующей после отправки не дольше, сек
+    command_ttl: int = 3600
+    # Построение сводок (минута, час, сутки) и очистка не реже, сек
+    compact_interval: int = 3600
+    # Срок хранения исходных показаний, дней
+    raw_days: int = 30
+    # Срок хранения минутных сводок, дней
+    minute_days: int = 90
+    # Срок хранения часовых сводок, дней (суточные хранятся всегда)
+    hour_days: int = 730
+
+
+class Warmup(BaseModel):
+    # Начинать запуск по расписанию заранее, чтобы к заданному времени
+    # двигатель был запущен
+    enabled: bool = True
+    # Максимальное опережение, мин
+    max_lead: int = 60
+    # Опережение, пока запусков для обучения мало, мин
+    default_minutes: int = 20
+    # Запусков, необходимых для прогноза по модели
+    min_runs: int = 5
+    # Сколько последних прогревов хранить для обучения
+    history: int = 200
+
+
+class Charts(BaseModel):
+    # Отправлять график температуры и напряжения по завершении запуска
+    enabled: bool = True
+    # Размер изображения, точек
+    width: int = 800
+    height: int = 400
+    # Процессов для построения графиков
+    workers: int = 1
+    # Сколько готовых графиков держать в памяти
+    cache_size: int = 32
+
+
+class Push(BaseModel):
+    # Телеметрия через WebSocket p-on.ru вместо фонового опроса /updates
+    enabled: bool = False
+    url: str = "wss://p-on.ru/api/v4/updates/ws"
+    # Максимальная пауза между переподключениями, сек
+    reconnect_max: int = 60
+
+
+class Fleet(BaseModel):
+    # Сколько холодных запусков выполняется одновременно
+    concurrency: int = 3
+    # Цель по умолчанию: "all", ID устройства или имя группы
+    default_target: str = "all"
+    # Группы авто: {"family": [123, 456]}
+    groups: Dict[str, List[int]] = {}
+
+
+class Account(BaseModel):
+    name: str
     login: str
     password: str
+    # Чат уведомлений, по умолчанию telegram.chat_id
+    chat_id: Optional[int] = None
+    # Кто управляет аккаунтом из бота (в дополнение к telegram.admin_chat_ids)
+    admin_chat_ids: List[int] = []
+    # Файл расписания, по умолчанию data/schedule_<name>.json
+    schedule_file: Optional[Path] = None
+
+    @property
+    def schedule_path(self) -> Path:
+        return self.schedule_file or BASE_DIR / f"data/schedule_{self.name}.json"
 
 
 class Schedule(BaseModel):
@@ -70,6 +255,54 @@ class Settings(BaseSettings):
     logging: LoggingConfig = LoggingConfig()
     pandora: Pandora
     telegram: Telegram
+    http: Http = Http()
+    retry: Retry = Retry()
+    commands: Commands = Commands()
+    resume: Resume = Resume()
+    fleet: Fleet = Fleet()
+    poller: Poller = Poller()
+    telemetry: Telemetry = Telemetry()
+    warmup: Warmup = Warmup()
+    charts: Charts = Charts()
+    push: Push = Push()
+    # Несколько аккаунтов Pandora в одном процессе
+    accounts: List[Account] = []
+
+    @model_validator(mode="after")
+    def fill_accounts(self):
+        if self.pandora.login and not any(
+            a.login == self.pandora.login for a in self.accounts
+        ):
+            self.accounts.insert(
+                0,
+                Account(
+                    name=DEFAULT_ACCOUNT,
+                    login=self.pandora.login,
+                    password=self.pandora.password,
+                    schedule_file=SCHEDULE_FILE,
+                ),
+            )
+        if not self.accounts:
+            raise ValueError("Не задан ни один аккаунт Pandora")
+        for account in self.accounts:
+            if account.chat_id is None:
+                account.chat_id = self.telegram.chat_id
+        return self
+
+    def get_account(self, name: Optional[str] = None) -> Account:
+        """Аккаунт по имени; без имени — первый (по умолчанию)."""
+        if name is None:
+            return self.accounts[0]
+        for account in self.accounts:
+            if account.name == name:
+                return account
+        raise ValueError(f"Неизвестный аккаунт: {name}")
+
+    def accounts_for_user(self, user_id: int) -> List[Account]:
+        """Аккаунты, которыми пользователь может управлять из бота."""
+        if user_id in self.telegram.admin_chat_ids:
+            return list(self.accounts)
+        return [a for a in self.accounts if user_id in a.admin_chat_ids]
 
 
 settings = Settings()
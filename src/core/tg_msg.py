@@ -1,19 +1,188 @@
+import asyncio
+import logging
+import time
+from html import escape
+from typing import Optional, Dict, List, Set
+
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+
 from apps.pandora.api import PandoraState
-from core.config import bot, settings
+from core.config import settings
+from core.tg_outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+# Части карточки статуса
+PARAMS = "params"
+PROGRESS = "progress"
+EVENT = "event"
+
+# Открытые карточки запусков по id(state)
+_cards: Dict[int, "StatusCard"] = {}
+# Завершающие правки карточек, которые ещё отправляются
+_finishing: Set[asyncio.Task] = set()
+
+
+def _title(text: str, state: PandoraState = None) -> str:
+    if state is not None and state.name:
+        # На аккаунте несколько авто — указываем, к какому относится сообщение
+        text = f"🚘 <b>{escape(state.name)}</b>\n{text}"
+    return text
+
+
+def _chat_id(state: PandoraState = None) -> int:
+    chat_id = state.chat_id if state is not None else None
+    return chat_id or settings.telegram.chat_id
 
 
-async def _send_msg(text: str):
-    await bot.send_message(
-        text=text,
-        chat_id=settings.telegram.chat_id,
-        parse_mode="HTML",
+async def _send_msg(text: str, state: PandoraState = None, kind: str = EVENT):
+    card = _cards.get(id(state)) if state is not None else None
+    if card is not None:
+        # Идёт запуск — сообщение попадает в его карточку статуса
+        card.add(text, kind)
+        return
+    # Сообщение уходит через очередь, процедура запуска Telegram не ждёт
+    outbox.send(_chat_id(state), _title(text, state), merge=True).add_done_callback(
+        _log_error
     )
 
 
+async def flush(timeout: float = 10):
+    """Дожидается итогов запусков и очереди сообщений при остановке."""
+    if _finishing:
+        await asyncio.wait(list(_finishing), timeout=timeout)
+    await outbox.close(timeout)
+
+
+def _log_error(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning("Сообщение не отправлено: %s", future.exception())
+
+
+class StatusCard:
+    """Одно сообщение о ходе запуска, которое редактируется на месте.
+
+    Сообщения msg_* по состоянию state, пока карточка открыта, попадают
+    в неё. Правки объединяются: не чаще раза в telegram.card_interval
+    секунд. finish() вносит последнюю правку и отправляет итог отдельным
+    сообщением.
+    """
+
+    max_events = 8
+
+    def __init__(self, state: PandoraState):
+        self.state = state
+        self.params: Optional[str] = None
+        self.progress: Optional[str] = None
+        self.events: List[str] = []
+        self.message_id: Optional[int] = None
+        self._edited_at = 0.0
+        self._dirty = False
+        self._sending = False
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def open(self) -> "StatusCard":
+        _cards[id(self.state)] = self
+        return self
+
+    def add(self, text: str, kind: str = EVENT):
+        if kind == PARAMS:
+            self.params = text
+        elif kind == PROGRESS:
+            self.progress = text
+        else:
+            self.events = (self.events + [text])[-self.max_events :]
+        self._dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+    def render(self) -> str:
+        parts = [p for p in (self.params, "\n".join(self.events), self.progress) if p]
+        return _title("\n\n".join(parts), self.state)
+
+    async def _flush(self):
+        while self._dirty:
+            delay = self._edited_at + settings.telegram.card_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._dirty = False
+            await self._publish()
+
+    async def _publish(self):
+        text = self.render()
+        if not text:
+            return
+        self._sending = True
+        try:
+            if self.message_id is None:
+                message = await outbox.send(_chat_id(self.state), text)
+                self.message_id = message.message_id
+            else:
+                await outbox.edit(_chat_id(self.state), self.message_id, text)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                # Сообщение удалено или недоступно — следующая правка создаст новое
+                logger.warning("Не удалось обновить карточку статуса: %s", e)
+                self.message_id = None
+        except TelegramAPIError as e:
+            logger.warning("Не удалось обновить карточку статуса: %s", e)
+        finally:
+            self._sending = False
+        self._edited_at = time.monotonic()
+
+    async def finish(self, summary: Optional[str] = None):
+        """Закрывает карточку: последняя правка и итог отправляются в фоне."""
+        _cards.pop(id(self.state), None)
+        task = asyncio.ensure_future(self._finish(summary))
+        _finishing.add(task)
+        task.add_done_callback(_finishing.discard)
+
+    async def _finish(self, summary: Optional[str]):
+        self._dirty = False
+        if self._flush_task is not None and not self._flush_task.done():
+            if self._sending:
+                # Карточка как раз отправляется — дожидаемся message_id
+                await self._flush_task
+            else:
+                self._flush_task.cancel()
+        try:
+            await self._publish()
+            if summary:
+                await outbox.send(
+                    _chat_id(self.state), _title(summary, self.state), merge=True
+                )
+        except TelegramAPIError as e:
+            logger.warning("Не удалось отправить итог запуска: %s", e)
+
+
+async def msg_chart(png: bytes, state: PandoraState, caption: str = ""):
+    """График запуска отдельным сообщением после его итога."""
+    outbox.send_photo(_chat_id(state), png, _title(caption, state)).add_done_callback(
+        _log_error
+    )
+
+
+def status_text(state: PandoraState, seen_at: Optional[float] = None) -> str:
+    """Текущие показания авто для ответа на /status.
+
+    seen_at — последний выход устройства на связь по его отметкам.
+    """
+    engine = "работает" if state.engine_on else "заглушен"
+    text = (
+        f"🌡️ Двигатель: {state.engine_temp} °C ({engine})\n"
+        f"🌍 Улица: {state.out_temp} °C\n"
+        f"🔋 Аккумулятор: {state.voltage} V"
+    )
+    if seen_at:
+        age = int(max(time.time() - seen_at, 0))
+        text += f"\n🕒 Обновлено {age} сек назад"
+    return _title(text, state)
+
+
 async def msg_wait(state: PandoraState):
     """Сообщение о текущем прогреве."""
     text = f"🌡️ Прогрев: {state.engine_temp}°C (попытка {state.count}/15)"
-    await _send_msg(text)
+    await _send_msg(text, state, PROGRESS)
 
 
 async def msg_params(state: PandoraState):
@@ -24,17 +193,22 @@ async def msg_params(state: PandoraState):
         f"Улица: {state.out_temp} °C\n"
         f"Аккумулятор: {state.voltage} V"
     )
-    await _send_msg(text)
+    await _send_msg(text, state, PARAMS)
+
+
+async def msg_text(text: str, state: PandoraState = None):
+    """Произвольное сообщение по ходу процедуры."""
+    await _send_msg(escape(text, quote=False), state)
 
 
-async def msg_cold_start():
+async def msg_cold_start(state: PandoraState = None):
     """Сообщение о начале холодного запуска."""
     text = (
         f"❄️ <b>Холодный запуск:</b>\n"
         f"Холодная погода и холодный двигатель\n"
         f"Начинаем прогрев до 30°C"
     )
-    await _send_msg(text)
+    await _send_msg(text, state)
 
 
 async def msg_start_wo_heater(state: PandoraState):
@@ -45,7 +219,7 @@ async def msg_start_wo_heater(state: PandoraState):
         f"Двигатель: {state.engine_temp_before}°C\n"
         f"Запуск двигателя, подогреватель не включился."
     )
-    await _send_msg(text)
+    await _send_msg(text, state)
 
 
 async def msg_ready(state: PandoraState):
@@ -55,7 +229,7 @@ async def msg_ready(state: PandoraState):
         f"Двигатель прогрет до {state.engine_temp}°C\n"
         f"Производится запуск двигателя."
     )
-    await _send_msg(text)
+    await _send_msg(text, state)
 
 
 async def msg_normal_start(state: PandoraState):
@@ -66,4 +240,4 @@ async def msg_normal_start(state: PandoraState):
         f"Двигатель: {state.engine_temp_before}°C\n"
         f"Запуск двигателя без предварительного прогрева"
     )
-    await _send_msg(text)
+    await _send_msg(text, state)
@@ -0,0 +1,243 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List, Deque
+
+from aiogram.types import BufferedInputFile
+from aiogram.exceptions import (
+    TelegramRetryAfter,
+    TelegramNetworkError,
+    TelegramServerError,
+)
+
+from core.config import bot, settings
+
+logger = logging.getLogger(__name__)
+
+SEND = "send"
+EDIT = "edit"
+PHOTO = "photo"
+
+# Максимальная длина сообщения Telegram
+MAX_TEXT = 4096
+
+
+class _Op:
+    def __init__(
+        self,
+        kind: str,
+        chat_id: int,
+        text: str,
+        parse_mode: Optional[str],
+        message_id: Optional[int] = None,
+    ):
+        self.kind = kind
+        self.chat_id = chat_id
+        self.text = text
+        self.parse_mode = parse_mode
+        self.message_id = message_id
+        self.photo: Optional[bytes] = None
+        # Сообщение может войти в общее с соседними: вызывающему не нужен
+        # собственный message_id
+        self.mergeable = False
+        self.futures: List[asyncio.Future] = []
+        self.attempts = 0
+
+    def resolve(self, result: Any = None, error: Optional[BaseException] = None):
+        for future in self.futures:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+class Outbox:
+    """Очередь исходящих сообщений бота с учётом ограничений Bot API.
+
+    Вызывающий получает future и не ждёт Telegram. Сообщения в один чат
+    уходят не чаще раза в telegram.chat_interval секунд, всего — не более
+    telegram.global_rate в секунду. На flood control (retry_after) чат
+    ставится на паузу, сетевые ошибки повторяются с нарастающей паузой.
+    Стоящие подряд уведомления в один чат (merge=True) объединяются,
+    повторные правки одного сообщения — заменяют друг друга. Карточки
+    и другие сообщения, которые потом правятся, не объединяются.
+    """
+
+    def __init__(self):
+        self._ops: Deque[_Op] = deque()
+        self._chat_ready: Dict[int, float] = {}
+        self._global_ready = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def send(
+        self,
+        chat_id: int,
+        text: str,
+        parse_mode: Optional[str] = "HTML",
+        merge: bool = False,
+    ) -> asyncio.Future:
+        """Ставит сообщение в очередь; future вернёт отправленное Message.
+
+        merge=True — только для уведомлений, которым не нужен собственный
+        message_id: такое сообщение может уйти вместе с соседними.
+        """
+        op = _Op(SEND, chat_id, text, parse_mode)
+        op.mergeable = merge
+        return self._submit(op)
+
+    def send_photo(
+        self,
+        chat_id: int,
+        photo: bytes,
+        caption: str = "",
+        parse_mode: Optional[str] = "HTML",
+    ) -> asyncio.Future:
+        """Ставит изображение PNG с подписью в очередь."""
+        op = _Op(PHOTO, chat_id, caption, parse_mode)
+        op.photo = photo
+        return self._submit(op)
+
+    def edit(
+        self,
+        chat_id: int,
+        message_id: int,
+        text: str,
+        parse_mode: Optional[str] = "HTML",
+    ) -> asyncio.Future:
+        """Ставит правку сообщения в очередь, заменяя ещё не отправленную."""
+        for op in self._ops:
+            if (
+                op.kind == EDIT
+                and op.chat_id == chat_id
+                and op.message_id == message_id
+            ):
+                op.text = text
+                op.parse_mode = parse_mode
+                future = asyncio.get_running_loop().create_future()
+                op.futures.append(future)
+                return future
+        return self._submit(_Op(EDIT, chat_id, text, parse_mode, message_id))
+
+    def _submit(self, op: _Op) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        op.futures.append(future)
+        self._ops.append(op)
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        return future
+
+    def _pick(self, now: float) -> Optional[_Op]:
+        """Первая операция, чат которой не на паузе."""
+        for op in self._ops:
+            if self._chat_ready.get(op.chat_id, 0.0) <= now:
+                self._ops.remove(op)
+                return op
+        return None
+
+    def _merge(self, op: _Op):
+        """Присоединяет к уведомлению следующие за ним уведомления в тот же чат."""
+        if op.kind != SEND or not op.mergeable:
+            return
+        for other in list(self._ops):
+            if other.chat_id != op.chat_id:
+                continue
+            if (
+                other.kind != SEND
+                or not other.mergeable
+                or other.parse_mode != op.parse_mode
+            ):
+                break
+            text = f"{op.text}\n\n{other.text}"
+            if len(text) > MAX_TEXT:
+                break
+            op.text = text
+            op.futures.extend(other.futures)
+            self._ops.remove(other)
+
+    async def _run(self):
+        while self._ops:
+            now = time.monotonic()
+            if now < self._global_ready:
+                await asyncio.sleep(self._global_ready - now)
+                continue
+            op = self._pick(now)
+            if op is None:
+                # Все чаты на паузе — ждём ближайший или новое сообщение
+                self._wakeup.clear()
+                wait = min(self._chat_ready.get(o.chat_id, 0.0) for o in self._ops)
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), max(wait - now, 0))
+                continue
+            self._merge(op)
+            await self._deliver(op)
+
+    async def _deliver(self, op: _Op):
+        config = settings.telegram
+        now = time.monotonic()
+        self._global_ready = now + 1 / config.global_rate
+        pause = config.chat_interval
+        try:
+            if op.kind == SEND:
+                result = await bot.send_message(
+                    chat_id=op.chat_id, text=op.text, parse_mode=op.parse_mode
+                )
+            elif op.kind == PHOTO:
+                result = await bot.send_photo(
+                    chat_id=op.chat_id,
+                    photo=BufferedInputFile(op.photo, filename="chart.png"),
+                    caption=op.text or None,
+                    parse_mode=op.parse_mode,
+                )
+            else:
+                result = await bot.edit_message_text(
+                    chat_id=op.chat_id,
+                    message_id=op.message_id,
+                    text=op.text,
+                    parse_mode=op.parse_mode,
+                )
+        except TelegramRetryAfter as e:
+            logger.warning(
+                "Telegram: пауза %s сек для чата %s", e.retry_after, op.chat_id
+            )
+            pause = e.retry_after
+            self._ops.appendleft(op)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            op.attempts += 1
+            if op.attempts >= config.send_attempts:
+                logger.error(
+                    "Telegram: сообщение в %s не отправлено: %s", op.chat_id, e
+                )
+                op.resolve(error=e)
+            else:
+                pause = min(2**op.attempts, 60)
+                logger.warning("Telegram: %s — повтор через %s сек", e, pause)
+                self._ops.appendleft(op)
+        except Exception as e:
+            op.resolve(error=e)
+        else:
+            op.resolve(result)
+        self._chat_ready[op.chat_id] = max(
+            self._chat_ready.get(op.chat_id, 0.0), time.monotonic() + pause
+        )
+
+    async def close(self, timeout: float = 10):
+        """Дожидается отправки очереди при остановке приложения."""
+        if self._task is None or self._task.done():
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Telegram: не отправлено сообщений: %d", len(self._ops))
+            self._task.cancel()
+
+
+outbox = Outbox()
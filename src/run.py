@@ -2,7 +2,16 @@ import asyncio
 import logging
 
 from apps.bot.bot_main import start_bot
+from apps.charts import charts
+from apps.fleet import resume_cold_starts
+from apps.jobs import jobs
+from apps.pandora.http import close_session
+from apps.pandora.poller import TelemetryPoller
+from apps.utils.checkpoint import checkpoints
+from apps.utils.telemetry import telemetry
 from apps.utils.schedule import schedule_all_tasks, scheduler
+from core import settings
+import core.tg_msg as tg_msg
 
 logger = logging.getLogger(__name__)
 
@@ -11,8 +20,27 @@ async def run_all():
     logger.info("Запускаем расписание")
     scheduler.start()
     schedule_all_tasks()
+    if settings.resume.enabled:
+        resumed = resume_cold_starts()
+        if resumed:
+            logger.info("Продолжаем прерванные холодные запуски: %d", resumed)
+    if settings.push.enabled:
+        logger.info("Подключаем push-канал телеметрии")
+        for account in settings.accounts:
+            TelemetryPoller.for_account(account).start_push()
     logger.info("Запускаем бота в основном потоке")
-    await start_bot()
+    try:
+        await start_bot()
+    finally:
+        # Идущие запуски сохраняют контрольные точки и продолжатся после старта
+        checkpoints.suspended = True
+        await jobs.shutdown()
+        await TelemetryPoller.close_all()
+        # Графики в фоне читают телеметрию: закрываем их раньше архива
+        await charts.close()
+        await telemetry.close()
+        await tg_msg.flush()
+        await close_session()
 
 
 def main():
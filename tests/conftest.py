@@ -0,0 +1,16 @@
+import os
+import sys
+from pathlib import Path
+
+# Приложение запускается из src/: модули импортируются как apps.*, core.*
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+# Минимальная конфигурация без .env; архив телеметрии в тестах не пишется
+os.environ.setdefault("APP_CONFIG__PANDORA__LOGIN", "test")
+os.environ.setdefault("APP_CONFIG__PANDORA__PASSWORD", "test")
+os.environ.setdefault(
+    "APP_CONFIG__TELEGRAM__TOKEN", "123456:ABCdefGhIJKlmnoPQRstuVWxyz"
+)
+os.environ.setdefault("APP_CONFIG__TELEGRAM__ADMIN_CHAT_IDS", "[1]")
+os.environ.setdefault("APP_CONFIG__TELEGRAM__CHAT_ID", "1")
+os.environ.setdefault("APP_CONFIG__TELEMETRY__ENABLED", "false")
@@ -0,0 +1,81 @@
+"""Локальная имитация push-канала p-on.ru для проверки PushTransport без сети."""
+
+import json
+import logging
+from typing import Optional, Dict, Any, Set
+
+from aiohttp import web, WSMsgType
+
+logger = logging.getLogger(__name__)
+
+WS_PATH = "/api/v4/updates/ws"
+
+
+class MockPushServer:
+    """WebSocket-сервер с протоколом push-канала: initial-state, state, command."""
+
+    def __init__(self, sid: str = "mock-sid", host: str = "127.0.0.1", port: int = 0):
+        self.sid = sid
+        self.host = host
+        self.port = port
+        self.states: Dict[int, Dict[str, Any]] = {}
+        self._clients: Set[web.WebSocketResponse] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}{WS_PATH}"
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get(WS_PATH, self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.info("Mock push-сервер запущен: %s", self.url)
+        return self.url
+
+    async def stop(self):
+        for ws in list(self._clients):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.WebSocketResponse:
+        if request.cookies.get("sid") != self.sid:
+            raise web.HTTPUnauthorized()
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._clients.add(ws)
+        try:
+            await ws.send_str(
+                json.dumps(
+                    {
+                        "type": "initial-state",
+                        "data": {str(k): v for k, v in self.states.items()},
+                    }
+                )
+            )
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            self._clients.discard(ws)
+        return ws
+
+    async def send(self, kind: str, data: Dict[str, Any]):
+        """Рассылает событие всем подключённым клиентам."""
+        message = json.dumps({"type": kind, "data": data})
+        for ws in list(self._clients):
+            await ws.send_str(message)
+
+    async def send_state(self, device_id: int, **stats):
+        self.states.setdefault(device_id, {}).update(stats)
+        await self.send("state", {"dev_id": device_id, **stats})
+
+    async def send_command_result(self, device_id: int, command: int, result: int = 0):
+        await self.send(
+            "command", {"dev_id": device_id, "command_id": command, "result": result}
+        )
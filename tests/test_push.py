@@ -0,0 +1,78 @@
+import asyncio
+
+from apps.pandora.commands import TrackedCommand
+from apps.pandora.http import close_session
+from apps.pandora.poller import TelemetryPoller
+from core import settings
+from push_server import MockPushServer
+
+
+async def _until(predicate, timeout: float = 5):
+    for _ in range(int(timeout / 0.05)):
+        if predicate():
+            return
+        await asyncio.sleep(0.05)
+    assert predicate()
+
+
+async def _connect(server: MockPushServer) -> TelemetryPoller:
+    url = await server.start()
+    poller = TelemetryPoller(settings.get_account())
+    poller._api._auth.cookies = {"sid": server.sid, "lang": "ru"}
+    poller.start_push(url)
+    await _until(lambda: poller.push_connected)
+    return poller
+
+
+async def _close(poller: TelemetryPoller, server: MockPushServer):
+    await poller.close()
+    await server.stop()
+    await close_session()
+
+
+def test_push_state():
+    async def scenario():
+        server = MockPushServer()
+        server.states[1] = {"engine_temp": -12, "out_temp": -20, "voltage": 12.6}
+        poller = await _connect(server)
+        try:
+            # initial-state
+            await _until(lambda: poller.latest(1) is not None)
+            assert poller.latest(1).engine_temp == -12
+            assert poller.latest(1).voltage == 12.6
+
+            updates = poller.subscribe(1)
+            pending = asyncio.ensure_future(updates.__anext__())
+            await asyncio.sleep(0)  # подписка регистрируется до события
+            await server.send_state(1, engine_temp=21, voltage=12.1)
+            state = await asyncio.wait_for(pending, 5)
+            assert state.engine_temp == 21
+            assert state.voltage == 12.1
+            assert state.out_temp == -20
+            assert "push" in poller.device_report(1)
+            await updates.aclose()
+        finally:
+            await _close(poller, server)
+
+    asyncio.run(scenario())
+
+
+def test_push_command_result():
+    async def scenario():
+        server = MockPushServer()
+        server.states[1] = {"engine_temp": -12}
+        poller = await _connect(server)
+        try:
+            results = asyncio.Queue()
+            poller.add_command_listener(lambda d, r: results.put_nowait((d, r)))
+            cmd = TrackedCommand(4, 1)
+
+            await server.send_command_result(1, 4, result=1)
+            device_id, result = await asyncio.wait_for(results.get(), 5)
+            assert device_id == 1
+            assert result == {"command_id": 4, "result": 1}
+            assert poller.commands._pushed(cmd) == result
+        finally:
+            await _close(poller, server)
+
+    asyncio.run(scenario())